@@ -0,0 +1,49 @@
+import time
+
+class ModelStatesPublisher(object):
+    ## Publishes all pose updates of ModelManager.apply_models as one gazebo_msgs/ModelStates message.
+    ## Stock gazebo_ros only subscribes to /gazebo/set_model_state (one model per message), so Gazebo needs a world
+    ## plugin subscribed to `topic` that sets the pose of every model in the message; without one nothing listens.
+    ## Messages are only sent once a subscriber is connected: the publisher waits up to connect_timeout seconds for one
+    ## when created, and a call without subscribers returns False, on which ModelManager falls back to set_model_state calls.
+    ## ModelManager only publishes moves with reconcile=True.
+
+    connect_timeout = 5.0 ## default seconds to wait for a subscriber when created; 0 does not wait
+    poll_interval = 0.05
+    
+    def __init__(self, topic='/gazebo/set_model_states', reference_frame='world', queue_size=1, connect_timeout=None):
+        import rospy
+        from gazebo_msgs.msg import ModelStates
+        self.topic = topic
+        self.reference_frame = reference_frame
+        self.queue_size = queue_size
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        self.publisher = rospy.Publisher(topic, ModelStates, queue_size=queue_size)
+        if self.connect_timeout > 0:
+            self.wait_for_subscriber(self.connect_timeout)
+
+    def wait_for_subscriber(self, timeout=None):
+        deadline = time.time() + (self.connect_timeout if timeout is None else timeout)
+        while self.publisher.get_num_connections() == 0 and time.time() < deadline:
+            time.sleep(self.poll_interval)
+        return self.publisher.get_num_connections() > 0
+
+    def __call__(self, names, positions, quaternions):
+        ## True when the message was published, False when no subscriber is connected
+        if self.publisher.get_num_connections() == 0:
+            return False
+
+        from gazebo_msgs.msg import ModelStates
+        from geometry_msgs.msg import Pose, Twist
+
+        msg = ModelStates()
+        msg.name = list(names)
+        for p, q in zip(positions.tolist(), quaternions.tolist()):
+            pose = Pose()
+            pose.position.x, pose.position.y, pose.position.z = p
+            pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w = q
+            msg.pose.append(pose)
+            msg.twist.append(Twist())
+        self.publisher.publish(msg)
+        return True
@@ -0,0 +1,180 @@
+import gc
+import sys
+import copy
+import json
+import time
+import argparse
+import subprocess
+import tracemalloc
+import numpy as np
+
+from .fake_proxy import FakeGazeboProxy
+
+## metrics where a larger value is a regression; rooms_per_sec is the only one where smaller is
+LOWER_IS_BETTER = ('spawn_p50', 'spawn_p99', 'bytes_per_room', 'deepcopy_per_model', 'import_seconds')
+
+## dependencies that importing roomor must not load; they are imported on first use
+HEAVY_MODULES = ('pcg_gazebo', 'trimesh', 'quaternion', 'shapely', 'randoor')
+
+def _generator(room, obstacle_count, proxy, **kwargs):
+    from .generator import CubeRoomGenerator, ChestRoomGenerator
+    cls = dict(cube=CubeRoomGenerator, chest=ChestRoomGenerator)[room]
+    return cls(obstacle_count=obstacle_count, gazebo_proxy=proxy, **kwargs)
+
+def bench_import(modules=('roomor.generator', 'roomor.dataset', 'roomor.grid_writer'), repeats=3):
+    ## best import time of modules in a fresh interpreter, and the HEAVY_MODULES the import loaded
+    code = (
+        'import sys, time\n'
+        't = time.time()\n'
+        'import {}\n'
+        'print(time.time() - t)\n'
+        'print(",".join(m for m in {!r} if m in sys.modules))\n'
+    ).format(', '.join(modules), HEAVY_MODULES)
+    times = list()
+    for _ in range(repeats):
+        out = subprocess.check_output([sys.executable, '-c', code]).decode().splitlines()
+        times.append(float(out[0]))
+    return dict(import_seconds=min(times), heavy_loaded=[m for m in out[1].split(',') if m])
+
+def bench_generation(room='cube', rooms=20, obstacle_count=10):
+    generator = _generator(room, obstacle_count, FakeGazeboProxy())
+    generator.generate_new() ## warm the model caches
+    start = time.time()
+    for _ in range(rooms):
+        generator.generate_new()
+    elapsed = time.time() - start
+    generator.model_manager.shutdown()
+    return dict(rooms_per_sec=rooms / elapsed)
+
+def bench_spawn(room='cube', rooms=20, obstacle_counts=(5, 10, 20), latency=0.002, jitter=0.0, **kwargs):
+    ## spawn_all latency per obstacle count against a FakeGazeboProxy with the given per call latency
+    results = dict()
+    for count in obstacle_counts:
+        proxy = FakeGazeboProxy(latency=latency, jitter=jitter, seed=0)
+        generator = _generator(room, count, proxy, **kwargs)
+        times = list()
+        for _ in range(rooms):
+            r = generator.generate_new()
+            start = time.time()
+            r.spawn_all()
+            times.append(time.time() - start)
+        generator.model_manager.shutdown()
+        results[count] = dict(
+            spawn_p50=float(np.percentile(times, 50)),
+            spawn_p99=float(np.percentile(times, 99)),
+            calls=dict(proxy.calls)
+        )
+    return results
+
+def bench_memory(room='cube', rooms=20, obstacle_count=10):
+    ## traced allocations kept alive by generated rooms, per room
+    generator = _generator(room, obstacle_count, FakeGazeboProxy())
+    generator.generate_new()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [generator.generate_new() for _ in range(rooms)]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(s.size_diff for s in after.compare_to(before, 'filename'))
+    generator.model_manager.shutdown()
+    del kept
+    return dict(bytes_per_room=size / float(rooms))
+
+def bench_deepcopy(room='cube', repeats=5, obstacle_count=10):
+    ## cost of the copy.deepcopy that get_moved_models does per model
+    generator = _generator(room, obstacle_count, FakeGazeboProxy())
+    r = generator.generate_new()
+    models = [m for tag in r.config_tags for m in generator.model_manager.modelspaces[tag]]
+    start = time.time()
+    for _ in range(repeats):
+        copy.deepcopy(models)
+    elapsed = time.time() - start
+    generator.model_manager.shutdown()
+    return dict(deepcopy_per_model=elapsed / (repeats * len(models)), models=len(models))
+
+def run(room='cube', rooms=20, obstacle_counts=(5, 10, 20), latency=0.002, jitter=0.0):
+    return dict(
+        room=room,
+        imports=bench_import(),
+        generation=bench_generation(room, rooms),
+        spawn=bench_spawn(room, rooms, obstacle_counts, latency, jitter),
+        memory=bench_memory(room, rooms),
+        deepcopy=bench_deepcopy(room)
+    )
+
+def _flatten(results):
+    flat = dict()
+    if 'imports' in results:
+        flat['import_seconds'] = results['imports']['import_seconds']
+    flat['rooms_per_sec'] = results['generation']['rooms_per_sec']
+    flat['bytes_per_room'] = results['memory']['bytes_per_room']
+    flat['deepcopy_per_model'] = results['deepcopy']['deepcopy_per_model']
+    for count, r in results['spawn'].items():
+        flat['spawn_p50@{}'.format(count)] = r['spawn_p50']
+        flat['spawn_p99@{}'.format(count)] = r['spawn_p99']
+    return flat
+
+def compare(results, baseline, tolerance=0.2):
+    ## [(metric, baseline, current)] of the metrics more than tolerance worse than baseline
+    current = _flatten(results)
+    base = _flatten(baseline)
+    regressions = list()
+    for k, v in current.items():
+        if not k in base or base[k] == 0:
+            continue
+        if k.split('@')[0] in LOWER_IS_BETTER:
+            worse = v > base[k] * (1 + tolerance)
+        else:
+            worse = v < base[k] * (1 - tolerance)
+        if worse:
+            regressions.append((k, base[k], v))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='roomor offline benchmarks with a fake gazebo proxy')
+    parser.add_argument('--room', default='cube', choices=['cube', 'chest'])
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--obstacle-counts', type=int, nargs='+', default=[5, 10, 20])
+    parser.add_argument('--latency', type=float, default=0.002, help='simulated seconds per gazebo call')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results json of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--imports-only', action='store_true', help='only check that importing roomor stays light')
+    args = parser.parse_args(argv)
+
+    if args.imports_only:
+        imports = bench_import()
+        print('{:<24} {:.6g}'.format('import_seconds', imports['import_seconds']))
+        if len(imports['heavy_loaded']) > 0:
+            print('REGRESSION importing roomor loads {}'.format(', '.join(imports['heavy_loaded'])))
+            return 1
+        return 0
+
+    results = run(args.room, args.rooms, args.obstacle_counts, args.latency, args.jitter)
+    for k, v in sorted(_flatten(results).items()):
+        print('{:<24} {:.6g}'.format(k, v))
+    status = 0
+    if len(results['imports']['heavy_loaded']) > 0:
+        print('REGRESSION importing roomor loads {}'.format(', '.join(results['imports']['heavy_loaded'])))
+        status = 1
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        baseline['spawn'] = dict((int(k), v) for k, v in baseline['spawn'].items())
+        regressions = compare(results, baseline, args.tolerance)
+        for k, b, v in regressions:
+            print('REGRESSION {}: {:.6g} -> {:.6g}'.format(k, b, v))
+        if len(regressions) > 0:
+            status = 1
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
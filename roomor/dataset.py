@@ -0,0 +1,176 @@
+import json
+import struct
+import numpy as np
+
+## layout: MAGIC | uint64 header length | json header | column data, each column aligned to ALIGN bytes.
+## the header maps column name -> {dtype, shape, offset} and holds the per-file parameters.
+MAGIC = b'ROOMOR01'
+ALIGN = 64
+
+def _wkb_columns(name, geometries):
+    ## geometries (None allowed) as concatenated WKB bytes plus (n+1,) offsets; None is stored empty
+    blobs = [g.wkb if g is not None else b'' for g in geometries]
+    return {
+        name+'_wkb': np.frombuffer(b''.join(blobs), dtype=np.uint8),
+        name+'_wkb_offsets': np.concatenate([[0], np.cumsum([len(b) for b in blobs])]).astype(np.int64)
+    }
+
+def _room_columns(rooms):
+    classes = list()
+    tags = list()
+    for r in rooms:
+        if not type(r).__name__ in classes:
+            classes.append(type(r).__name__)
+        for t in r.config_tags:
+            if not t in tags:
+                tags.append(t)
+
+    n = len(rooms)
+    ## the wall tag of each room class; walls are sized by their polygon, so they get no size column
+    wall_tags = set(r.wall_tag for r in rooms)
+    ## wall polygons: rings of every room concatenated, the first ring of a room is its exterior
+    rings = [[np.asarray(p.exterior.coords)[:,:2]] + [np.asarray(i.coords)[:,:2] for i in p.interiors] for p in (r.wall_polygon for r in rooms)]
+    ring_lengths = [len(c) for rs in rings for c in rs]
+    columns = dict(
+        room_class=np.array([classes.index(type(r).__name__) for r in rooms], dtype=np.int32),
+        wall_thickness=np.array([r.wall_thickness for r in rooms], dtype=np.float64),
+        wall_height=np.array([r.wall_height for r in rooms], dtype=np.float64),
+        merge_flags=np.array([[r.obstacle_tag in r.merge_tags, r.wall_tag in r.merge_tags] for r in rooms], dtype=np.bool_).reshape(n,2),
+        ring_vertices=np.concatenate([c for rs in rings for c in rs]) if len(ring_lengths) > 0 else np.zeros([0,2]),
+        ring_offsets=np.concatenate([[0], np.cumsum(ring_lengths)]).astype(np.int64),
+        room_ring_offsets=np.concatenate([[0], np.cumsum([len(rs) for rs in rings])]).astype(np.int64)
+    )
+    ## freespace/freezone come from the randoor config, which is not stored; loaded rooms use these instead
+    columns.update(_wkb_columns('freespace', [r.get_freespace_poly() for r in rooms]))
+    columns.update(_wkb_columns('freezone', [r.get_freezone_poly() for r in rooms]))
+    for t in tags:
+        poses = [r.get_poses(t) if t in r.config_tags else np.zeros([0,6]) for r in rooms]
+        columns[t+'_poses'] = np.concatenate(poses) if n > 0 else np.zeros([0,6])
+        columns[t+'_offsets'] = np.concatenate([[0], np.cumsum([len(p) for p in poses])]).astype(np.int64)
+        columns[t+'_capacity'] = np.array([
+            r.tag_slices[t].stop - r.tag_slices[t].start if t in r.config_tags else 0 for r in rooms
+        ], dtype=np.int64)
+        if not t in wall_tags:
+            columns[t+'_size'] = np.array([
+                getattr(r, t+'_size', [np.nan]*3) if t in r.config_tags else [np.nan]*3 for r in rooms
+            ], dtype=np.float64).reshape(n,3)
+
+    return columns, dict(classes=classes, tags=tags, count=n)
+
+def save_rooms(path, rooms):
+    ## write RoomConfigs (e.g. CubeRoomConfig, ChestRoomConfig) into one columnar file for RoomDataset
+    columns, params = _room_columns(list(rooms))
+    names = sorted(columns.keys())
+
+    header = dict(params=params, columns=dict())
+    offset = 0
+    for name in names:
+        a = np.ascontiguousarray(columns[name])
+        header['columns'][name] = dict(dtype=a.dtype.str, shape=list(a.shape), offset=offset)
+        offset += -(-a.nbytes // ALIGN) * ALIGN
+    header_bytes = json.dumps(header).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGN) * ALIGN
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for name in names:
+            a = np.ascontiguousarray(columns[name])
+            f.seek(data_start + header['columns'][name]['offset'])
+            f.write(a.tobytes())
+        f.truncate(data_start + offset)
+
+class RoomDataset(object):
+    ## Memory-mapped reader of save_rooms files. Rooms are rebuilt on access and carry no randoor config;
+    ## their freespace and freezone polygons are read from the file (files written before these were stored have none).
+
+    def __init__(self, path, model_manager=None):
+        self.path = path
+        self.model_manager = model_manager
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('{} is not a roomor room dataset'.format(path))
+            length = struct.unpack('<Q', f.read(8))[0]
+            header = json.loads(f.read(length).decode())
+        data_start = -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+
+        self.params = header['params']
+        self.columns = dict()
+        for name, c in header['columns'].items():
+            shape = tuple(c['shape'])
+            if int(np.prod(shape)) == 0:
+                self.columns[name] = np.zeros(shape, dtype=c['dtype'])
+            else:
+                self.columns[name] = np.memmap(path, dtype=c['dtype'], mode='r', offset=data_start+c['offset'], shape=shape)
+
+    def __len__(self):
+        return self.params['count']
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('room index {} out of range'.format(index))
+        return self._build_room(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._build_room(i)
+
+    def get_wall_polygon(self, index):
+        from shapely.geometry import Polygon
+        rings = self.columns['ring_offsets']
+        r0, r1 = self.columns['room_ring_offsets'][index:index+2]
+        coords = [np.array(self.columns['ring_vertices'][rings[i]:rings[i+1]]) for i in range(r0, r1)]
+        return Polygon(coords[0], coords[1:])
+
+    def get_geometry(self, name, index):
+        ## stored shapely geometry ('freespace' or 'freezone') of a room, or None
+        if not name+'_wkb' in self.columns:
+            return None
+        o = self.columns[name+'_wkb_offsets']
+        if o[index] == o[index+1]:
+            return None
+        import shapely.wkb
+        return shapely.wkb.loads(bytes(self.columns[name+'_wkb'][o[index]:o[index+1]]))
+
+    def get_poses(self, tag, index):
+        ## (count,6) read-only view into the mapped file
+        o = self.columns[tag+'_offsets']
+        return self.columns[tag+'_poses'][o[index]:o[index+1]]
+
+    def _build_room(self, index):
+        from . import generator
+        cls = getattr(generator, self.params['classes'][self.columns['room_class'][index]])
+        tags = [t for t in self.params['tags'] if self.columns[t+'_capacity'][index] > 0]
+        merge_obstacles, merge_wall = self.columns['merge_flags'][index]
+
+        sizes = dict((t+'_size', list(self.columns[t+'_size'][index])) for t in tags if t+'_size' in self.columns)
+        room = cls(
+            model_manager=self.model_manager,
+            randoor_config=None,
+            wall_polygon=self.get_wall_polygon(index),
+            wall_thickness=float(self.columns['wall_thickness'][index]),
+            wall_height=float(self.columns['wall_height'][index]),
+            merge_obstacles=bool(merge_obstacles),
+            merge_wall=bool(merge_wall),
+            **sizes
+        )
+
+        room.freespace_poly = self.get_geometry('freespace', index)
+        room.freezone_poly = self.get_geometry('freezone', index)
+
+        capacities = dict((t, int(self.columns[t+'_capacity'][index])) for t in tags)
+        if self.model_manager is not None:
+            ## prepare_model_manager(max_obstacle_count, max_target_count, ...) takes every tag but the wall's
+            room.prepare_model_manager(**dict(('max_{}_count'.format(t), c) for t, c in capacities.items() if t != room.wall_tag))
+        else:
+            for t, c in capacities.items():
+                room.register_empty(t, getattr(room, t+'_config_base'), c)
+
+        for t in tags:
+            poses = self.get_poses(t, index)
+            room.register_positions(t, poses[:,:3])
+            room.register_orientations(t, poses[:,3:])
+        return room
@@ -0,0 +1,142 @@
+import time
+import asyncio
+import threading
+import numpy as np
+from types import SimpleNamespace
+from collections import Counter, defaultdict
+
+def _set_model_state_request():
+    ## shaped like gazebo_msgs/SetModelStateRequest
+    return SimpleNamespace(model_state=SimpleNamespace(
+        model_name='',
+        pose=SimpleNamespace(position=SimpleNamespace(x=0.0, y=0.0, z=0.0), orientation=SimpleNamespace(x=0.0, y=0.0, z=0.0, w=1.0)),
+        reference_frame=''
+    ))
+
+class _FakeService(object):
+    ## callable like the rospy.ServiceProxy objects of GazeboProxy._services
+    def __init__(self, call, request_class):
+        self.call = call
+        self.request_class = request_class
+
+    def __call__(self, request):
+        return self.call(request)
+
+class FakeGazeboProxy(object):
+    ## In-process stand-in for pcg_gazebo's GazeboProxy, for benchmarks and tests without ROS or Gazebo.
+    ## Every call sleeps latency (+ uniform jitter) seconds; latency may be a dict of per-call latencies.
+    ## serialize=True handles one call at a time, like gazebo_ros services do.
+    ## Its state lives in this process, so use it with ModelManager's 'thread' executor.
+
+    def __init__(self, latency=0.0, jitter=0.0, serialize=False, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.serialize = serialize
+        self.models = dict() ## name: (model, pos, rot)
+        self.calls = Counter()
+        self.call_times = defaultdict(list) ## call name: [seconds]
+        self._random = np.random.RandomState(seed)
+        self._lock = threading.Lock()
+        self._service_lock = threading.Lock()
+        self._async_service_lock = None
+        ## ModelManager moves models through GazeboProxy's set_model_state service rather than move_model
+        self._services = dict(set_model_state=_FakeService(self._set_model_state, _set_model_state_request))
+
+    def _latency(self, call):
+        latency = self.latency.get(call, 0.0) if isinstance(self.latency, dict) else self.latency
+        with self._lock:
+            if self.jitter > 0:
+                latency += self._random.uniform(0, self.jitter)
+            self.calls[call] += 1
+        return latency
+
+    async def _await(self, call):
+        ## coroutine counterpart of _wait; serialize uses an asyncio lock made on first use inside the running loop
+        latency = self._latency(call)
+        start = time.time()
+        if latency > 0:
+            if self.serialize:
+                if self._async_service_lock is None:
+                    self._async_service_lock = asyncio.Lock()
+                async with self._async_service_lock:
+                    await asyncio.sleep(latency)
+            else:
+                await asyncio.sleep(latency)
+        with self._lock:
+            self.call_times[call].append(time.time() - start)
+
+    def _wait(self, call):
+        latency = self._latency(call)
+        start = time.time()
+        if latency > 0:
+            if self.serialize:
+                with self._service_lock:
+                    time.sleep(latency)
+            else:
+                time.sleep(latency)
+        with self._lock:
+            self.call_times[call].append(time.time() - start)
+
+    def reset(self):
+        with self._lock:
+            self.models.clear()
+            self.calls.clear()
+            self.call_times.clear()
+
+    def is_init(self):
+        return True
+
+    def get_model_names(self):
+        self._wait('get_model_names')
+        return self._model_names()
+
+    def _model_names(self):
+        with self._lock:
+            return list(self.models.keys())
+
+    def model_exists(self, model_name):
+        return model_name in self.get_model_names()
+
+    def delete_model(self, model_name):
+        self._wait('delete_model')
+        return self._delete(model_name)
+
+    def _delete(self, model_name):
+        with self._lock:
+            return self.models.pop(model_name, None) is not None
+
+    def move_model(self, model_name, pos, rot=[0, 0, 0], reference_frame='world'):
+        self._wait('move_model')
+        return self._move(model_name, pos, rot)
+
+    def _move(self, model_name, pos, rot):
+        with self._lock:
+            if not model_name in self.models:
+                return False
+            self.models[model_name] = (self.models[model_name][0], list(pos), list(rot))
+            return True
+
+    def _set_model_state(self, request):
+        self._wait('set_model_state')
+        state = request.model_state
+        p = state.pose.position
+        q = state.pose.orientation
+        return SimpleNamespace(success=self._move(state.model_name, [p.x, p.y, p.z], [q.x, q.y, q.z, q.w]))
+
+    def spawn_sdf_model(self, robot_namespace, xml, pos=[0, 0, 0], rot=[0, 0, 0, 1], reference_frame='world'):
+        ## ModelManager spawns by calling this with the model's SDF, as it does on a real GazeboProxy
+        self._wait('spawn_sdf_model')
+        with self._lock:
+            self.models[robot_namespace] = (xml, list(pos), list(rot))
+            return True
+
+    ## coroutine counterparts, awaited by ModelManager's *_async methods instead of running the calls on threads
+
+    async def async_get_model_names(self):
+        await self._await('get_model_names')
+        return self._model_names()
+
+    async def async_delete_model(self, model_name):
+        await self._await('delete_model')
+        return self._delete(model_name)
+
@@ -1,9 +1,6 @@
-import numpy as np
-
-from randoor.generator import SimpleSearchRoomGenerator, SimpleSearchRoomConfig
-from shapely.geometry.polygon import Polygon
-
-from ..room_generator_factory import RoomGeneratorFactory, RoomConfig
+from ..room_generator_factory import RoomGeneratorFactory, RoomConfig, randoor_call, run_blocking
+from ..geometric_util import polygon_digest, square_footprints, wall_footprint
+from .. import instrumentation
 
 class CubeRoomConfig(RoomConfig):
     
@@ -15,6 +12,8 @@ class CubeRoomConfig(RoomConfig):
                  wall_height,
                  obstacle_size, 
                  target_size,
+                 merge_obstacles=False,
+                 merge_wall=False
     ):
         
         super(CubeRoomConfig, self).__init__(model_manager, randoor_config)
@@ -31,6 +30,13 @@ class CubeRoomConfig(RoomConfig):
         self.obstacle_tag = 'obstacle'
         self.target_tag = 'target'
         
+        ## merged spawn: obstacles (and optionally the wall) become links of one static model
+        if merge_obstacles:
+            self.merge_tags.append(self.obstacle_tag)
+        if merge_wall:
+            self.merge_tags.append(self.wall_tag)
+        self.occupancy_tags.extend([self.wall_tag, self.obstacle_tag])
+        
         self.wall_color = 'black'
         self.obstacle_color = 'white'
         self.target_color = 'cyan'
@@ -51,6 +57,8 @@ class CubeRoomConfig(RoomConfig):
             )
         ]
         
+        self.cache_keys[self.wall_tag] = polygon_digest(wall_polygon, wall_thickness, wall_height)
+        
         self.obstacle_config_base = [
             dict(
                 type='box',
@@ -85,14 +93,17 @@ class CubeRoomConfig(RoomConfig):
     def obstacle_pose(self):
         return self.spawn_config[self.obstacle_tag]
         
-    def prepare_model_manager(self, max_obstacle_count, max_target_count):
+    def prepare_model_manager(self, max_obstacle_count, max_target_count, build_models=True):
+        ## build_models=False only registers the tags; spawn_all then builds their modelspaces (see set_modelspaces)
         self.register_empty(self.wall_tag, self.wall_config_base, 1)
-        self.set_modelspace_force(self.wall_tag)
-        
         self.register_empty(self.obstacle_tag, self.obstacle_config_base, max_obstacle_count)
-        self.set_modelspace(self.obstacle_tag)
-        
         self.register_empty(self.target_tag, self.target_config_base, max_target_count)
+        if build_models:
+            self.set_modelspaces()
+
+    def set_modelspaces(self):
+        self.set_modelspace_force(self.wall_tag)
+        self.set_modelspace(self.obstacle_tag)
         self.set_modelspace(self.target_tag, disable_collision=True)
 
     def set_components_pose(self, obstacle_poss, obstacle_oris, target_poss, target_oris):
@@ -125,15 +136,13 @@ class CubeRoomConfig(RoomConfig):
         else:
             return None
         
-    def spawn_all(self):
-        self.set_modelspace_force(self.wall_tag)
-        super(CubeRoomConfig, self).spawn_all()
+    def _prepare_spawn(self):
+        ## the wall's modelspace belongs to this room; the others are only built if no room built them yet
+        with instrumentation.span('spawn_all.modelspace'):
+            self.set_modelspaces()
         
-    def get_freespace_poly(self):
-        return self.randoor_config.get_freespace_poly()
-    
-    def get_freezone_poly(self):
-        return self.randoor_config.get_freezone_poly()
+    def get_obstacle_footprints(self):
+        return [wall_footprint(self.wall_polygon, self.wall_thickness)] + square_footprints(self.get_poses(self.obstacle_tag), self.obstacle_size)
         
 class CubeRoomGenerator(RoomGeneratorFactory):
     
@@ -149,9 +158,12 @@ class CubeRoomGenerator(RoomGeneratorFactory):
                  ros_host="localhost", 
                  ros_port=11311, 
                  gazebo_host='localhost', 
-                 gazebo_port=11345):
+                 gazebo_port=11345,
+                 merge_obstacles=False,
+                 merge_wall=False,
+                 **kwargs):
         
-        super(CubeRoomGenerator, self).__init__(ros_host, ros_port, gazebo_host, gazebo_port)
+        super(CubeRoomGenerator, self).__init__(ros_host, ros_port, gazebo_host, gazebo_port, **kwargs)
         
         ## randoor SimpleSearchRoomGenerator's parameter ##
         self.obstacle_count = obstacle_count
@@ -163,6 +175,7 @@ class CubeRoomGenerator(RoomGeneratorFactory):
         self.wall_threshold = wall_threshold
         ###################################################
 
+        from randoor.generator import SimpleSearchRoomGenerator
         self.randoor_generator = SimpleSearchRoomGenerator(
             obstacle_count=obstacle_count,
             obstacle_size=obstacle_size,
@@ -174,61 +187,42 @@ class CubeRoomGenerator(RoomGeneratorFactory):
         )
 
         self.room_wall_height = room_wall_height
-    
-    def generate_new(self):
-        randoor_config = self.randoor_generator.generate_new()
+        self.merge_obstacles = merge_obstacles
+        self.merge_wall = merge_wall
         
-        ## get base shape from wall polygon
-        wall_poly = randoor_config.get_polygons(randoor_config.tag_wall)[0]
-        wall_base = Polygon(wall_poly.exterior.coords).buffer(-self.room_wall_thickness, cap_style=3, join_style=2)
+        self.pose_tags = [
+            ('obstacle', 'tag_obstacle', obstacle_size/2),
+            ('target', 'tag_target', target_size/2)
+        ]
 
+    def _build_room(self, components, poses, build_models=True):
         room_instance = CubeRoomConfig(
                 model_manager=self.model_manager,
-                randoor_config=randoor_config,
-                wall_polygon=wall_base, 
+                randoor_config=components['randoor_config'],
+                wall_polygon=components['wall_base'], 
                 wall_thickness=self.room_wall_thickness,
                 wall_height=self.room_wall_height,
                 obstacle_size=[self.obstacle_size for _ in range(3)], 
-                target_size=[self.target_size for _ in range(3)]
+                target_size=[self.target_size for _ in range(3)],
+                merge_obstacles=self.merge_obstacles,
+                merge_wall=self.merge_wall
         )
         
-        room_instance.prepare_model_manager(self.obstacle_count, self.obstacle_count)
-        
-        
-        obstacle_xyy = np.array(randoor_config.get_positions(randoor_config.tag_obstacle))
-        obstacle_poss = np.empty([len(obstacle_xyy), 3])
-        obstacle_poss[:,:2] = obstacle_xyy[:,:2]
-        obstacle_poss[:,2] = self.obstacle_size/2
-        obstacle_oris = np.zeros_like(obstacle_poss)
-        obstacle_oris[:,2] = obstacle_xyy[:,2]
-
-        target_xyy = np.array(randoor_config.get_positions(randoor_config.tag_target))
-        target_poss = np.empty([len(target_xyy), 3])
-        target_poss[:,:2] = target_xyy[:,:2]
-        target_poss[:,2] = self.target_size/2
-        target_oris = np.zeros_like(target_poss)
-        target_oris[:,2] = target_xyy[:,2]
-
-        room_instance.set_components_pose(
-            obstacle_poss=obstacle_poss, 
-            obstacle_oris=obstacle_oris, 
-            target_poss=target_poss,
-            target_oris=target_oris
-        )
+        with instrumentation.span('generate_new.modelspace'):
+            room_instance.prepare_model_manager(self.obstacle_count, self.obstacle_count, build_models=build_models)
+        with instrumentation.span('generate_new.register'):
+            room_instance.set_components_pose(**self._pose_kwargs(poses))
         
         return room_instance
 
     def reposition_target(self, room_config):
-        randoor_config = room_config.randoor_config
-        self.randoor_generator.reposition_target(randoor_config)
-
-        target_xyy = np.array(randoor_config.get_positions(randoor_config.tag_target))
-        target_poss = np.empty([len(target_xyy), 3])
-        target_poss[:,:2] = target_xyy[:,:2]
-        target_poss[:,2] = self.target_size/2
-        target_oris = np.zeros_like(target_poss)
-        target_oris[:,2] = target_xyy[:,2]
+        with instrumentation.span('reposition_target'):
+            with instrumentation.span('reposition_target.randoor'):
+                randoor_call(self.randoor_generator.reposition_target, room_config.randoor_config)
+            self._reposition(room_config, 'target', room_config.target_tag)
 
-        room_config.register_positions(room_config.target_tag, target_poss)
-        room_config.register_orientations(room_config.target_tag, target_oris)
-        room_config.apply(room_config.target_tag)
+    async def reposition_target_async(self, room_config, semaphore=None):
+        with instrumentation.span('reposition_target'):
+            with instrumentation.span('reposition_target.randoor'):
+                await run_blocking(randoor_call, self.randoor_generator.reposition_target, room_config.randoor_config)
+            await self._reposition_async(room_config, 'target', room_config.target_tag, semaphore)
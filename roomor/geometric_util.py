@@ -1,10 +1,8 @@
 import numpy as np
-import quaternion
-import shapely
-from shapely.geometry import Polygon
-import trimesh
-import pcg_gazebo
 import copy
+import hashlib
+
+## quaternion, shapely and trimesh are imported by the functions that use them, so importing roomor stays fast
 
 def vec_to_trans(vec):
     a = np.identity(len(vec)+1)
@@ -12,38 +10,287 @@ def vec_to_trans(vec):
     return a
 
 def add_dimension(points, value=0):
-    return np.concatenate([points[np.newaxis,:,i].T if i<len(points[0]) else np.full([len(points),1], value) for i in range(len(points[0])+1)], 1)
-    
+    ## (...,d) -> (...,d+1) with value in the new last column
+    points = np.asarray(points)
+    out = np.empty(points.shape[:-1]+(points.shape[-1]+1,), dtype=np.result_type(points, value))
+    out[...,:-1] = points
+    out[...,-1] = value
+    return out
+
+## corners of the unit square in the order get_square_horizon returns them
+SQUARE_CORNERS = np.array([[1,1],[1,-1],[-1,-1],[-1,1]], dtype=float)
+
+def get_square_horizons(base_pos, radius, z_angle=0):
+    ## corners of horizontal squares of half side radius rotated by z_angle about base_pos.
+    ## base_pos (...,3), radius and z_angle broadcast against base_pos[...,0]; returns (...,4,3)
+    base_pos = np.asarray(base_pos, dtype=float)
+    radius = np.asarray(radius, dtype=float)
+    z_angle = np.asarray(z_angle, dtype=float)
+    shape = np.broadcast(base_pos[...,0], radius, z_angle).shape
+    c = np.broadcast_to(np.cos(z_angle), shape)[...,np.newaxis]
+    s = np.broadcast_to(np.sin(z_angle), shape)[...,np.newaxis]
+    r = np.broadcast_to(radius, shape)[...,np.newaxis]
+    dx = SQUARE_CORNERS[:,0] * r
+    dy = SQUARE_CORNERS[:,1] * r
+    out = np.empty(shape+(4,3))
+    out[...,0] = c*dx - s*dy
+    out[...,1] = s*dx + c*dy
+    out[...,2] = 0
+    return out + np.broadcast_to(base_pos, shape+(3,))[...,np.newaxis,:]
+
 def get_square_horizon(base_pos, radius, z_angle=0):
-    d1 = [1,1,-1,-1]
-    d2 = [1,-1,-1,1]
-    poss = np.array([np.quaternion(1,d1[i]*radius,d2[i]*radius,0) for i in range(4)])
-    q = quaternion.from_euler_angles(0,0,z_angle)
-    pq = q*poss*q.conj()
-    
-    return np.array([[p.x, p.y, p.z] for p in pq])+base_pos
+    return get_square_horizons(base_pos, radius, z_angle)
+
+def square_footprints(poses, size):
+    ## shapely rectangles of size[0] x size[1] centered on (N,6) poses, rotated by their yaw
+    from shapely.geometry import Polygon
+    poses = np.asarray(poses, dtype=float).reshape(-1,6)
+    c = np.cos(poses[:,5])[:,np.newaxis]
+    s = np.sin(poses[:,5])[:,np.newaxis]
+    lx = SQUARE_CORNERS[:,0] * size[0] / 2
+    ly = SQUARE_CORNERS[:,1] * size[1] / 2
+    xs = c*lx - s*ly + poses[:,0:1]
+    ys = s*lx + c*ly + poses[:,1:2]
+    return [Polygon(np.stack([x, y], axis=1)) for x, y in zip(xs, ys)]
+
+def wall_footprint(wall_polygon, thickness):
+    ## area covered by the wall pcg extrudes from wall_polygon: its rings buffered by the full thickness, like randoor's wall
+    return wall_polygon.boundary.buffer(thickness, cap_style=3, join_style=2)
+
+def euler_to_quaternion(rpy):
+    ## (N,3) [roll, pitch, yaw] -> (N,4) [qx, qy, qz, qw]
+    rpy = np.asarray(rpy, dtype=float)
+    c = np.cos(rpy/2)
+    s = np.sin(rpy/2)
+    q = np.empty([len(rpy), 4])
+    q[:,0] = s[:,0]*c[:,1]*c[:,2] - c[:,0]*s[:,1]*s[:,2]
+    q[:,1] = c[:,0]*s[:,1]*c[:,2] + s[:,0]*c[:,1]*s[:,2]
+    q[:,2] = c[:,0]*c[:,1]*s[:,2] - s[:,0]*s[:,1]*c[:,2]
+    q[:,3] = c[:,0]*c[:,1]*c[:,2] + s[:,0]*s[:,1]*s[:,2]
+    return q
+
+def quaternion_to_euler(q):
+    ## (N,4) [qx, qy, qz, qw] -> (N,3) [roll, pitch, yaw]
+    q = np.asarray(q, dtype=float)
+    x, y, z, w = q[:,0], q[:,1], q[:,2], q[:,3]
+    rpy = np.empty([len(q), 3])
+    rpy[:,0] = np.arctan2(2*(w*x + y*z), 1 - 2*(x*x + y*y))
+    rpy[:,1] = np.arcsin(np.clip(2*(w*y - z*x), -1, 1))
+    rpy[:,2] = np.arctan2(2*(w*z + x*y), 1 - 2*(y*y + z*z))
+    return rpy
+
+def xyy_to_poses(xyy, height):
+    ## (...,3) [x, y, yaw] -> (...,6) [x, y, height, 0, 0, yaw]; any leading batch shape
+    xyy = np.asarray(xyy, dtype=float)
+    poses = np.zeros(xyy.shape[:-1]+(6,))
+    poses[...,:2] = xyy[...,:2]
+    poses[...,2] = height
+    poses[...,5] = xyy[...,2]
+    return poses
+
+def polygon_digest(polygon, *params):
+    ## hash of the polygon's rings plus extra parameters (e.g. thickness, height)
+    h = hashlib.sha1()
+    for ring in [polygon.exterior] + list(polygon.interiors):
+        h.update(np.asarray(ring.coords, dtype=np.float64).tobytes())
+        h.update(b'|')
+    h.update(repr(params).encode())
+    return h.hexdigest()
+
+def polygon_contains_xy(polygon, x, y):
+    ## vectorized point-in-polygon over arrays of x, y
+    import shapely
+    if hasattr(shapely, 'contains_xy'):
+        return shapely.contains_xy(polygon, x, y)
+    from shapely import vectorized
+    return vectorized.contains(polygon, x, y)
+
+def rasterize_polygon(polygon, resolution, margin=0):
+    ## bool [y, x] grid of the cells whose centers lie in polygon, and the (x, y) center of cell [0, 0]
+    minx, miny, maxx, maxy = polygon.bounds
+    x0, y0 = minx - margin, miny - margin
+    xs = x0 + np.arange(int(np.ceil((maxx + margin - x0) / resolution)) + 1) * resolution
+    ys = y0 + np.arange(int(np.ceil((maxy + margin - y0) / resolution)) + 1) * resolution
+    xx, yy = np.meshgrid(xs, ys)
+    return polygon_contains_xy(polygon, xx, yy), (x0, y0)
+
+def downsample_grid(grid, factor):
+    ## [y, x] bool grid -> grid of factor x factor blocks that are True only if every cell of the block is
+    h = -(-grid.shape[0] // factor) * factor
+    w = -(-grid.shape[1] // factor) * factor
+    padded = np.zeros([h, w], dtype=bool)
+    padded[:grid.shape[0], :grid.shape[1]] = grid
+    return padded.reshape(h//factor, factor, w//factor, factor).all(axis=(1,3))
+
+def resample_grids(grid, grid_origin, grid_resolution, poses, resolution, map_size, chunk_cells=1<<22):
+    ## nearest-neighbour samples of a [y, x] grid for each (N,3) [x, y, yaw] origin, laid out like randoor's occupancy grid:
+    ## cell [r, c] is at (lin[c], lin[r]) in the origin frame, lin = linspace(-map_size*resolution/2, map_size*resolution/2, map_size).
+    ## cells outside grid are False. returns (N, map_size, map_size) bool
+    poses = np.asarray(poses, dtype=float).reshape(-1,3)
+    half_length = (map_size * resolution) / 2
+    lin = np.linspace(-half_length, half_length, map_size)
+    qx, qy = np.meshgrid(lin, lin)
+    qx = qx.ravel()
+    qy = qy.ravel()
+
+    out = np.zeros([len(poses), map_size*map_size], dtype=bool)
+    step = max(1, chunk_cells // (map_size*map_size))
+    for start in range(0, len(poses), step):
+        p = poses[start:start+step]
+        c = np.cos(p[:,2])[:,np.newaxis]
+        s = np.sin(p[:,2])[:,np.newaxis]
+        ix = np.rint((c*qx - s*qy + p[:,0:1] - grid_origin[0]) / grid_resolution).astype(np.intp)
+        iy = np.rint((s*qx + c*qy + p[:,1:2] - grid_origin[1]) / grid_resolution).astype(np.intp)
+        inside = (ix >= 0) & (ix < grid.shape[1]) & (iy >= 0) & (iy < grid.shape[0])
+        out[start:start+step][inside] = grid[iy[inside], ix[inside]]
+    return out.reshape(len(poses), map_size, map_size)
+
+def sample_grid(grid, grid_origin, grid_resolution, points, fill=0):
+    ## nearest cell values of a [y, x] grid at (N,2) [x, y] points; fill outside the grid
+    points = np.asarray(points, dtype=float).reshape(-1,2)
+    ix = np.rint((points[:,0] - grid_origin[0]) / grid_resolution).astype(np.intp)
+    iy = np.rint((points[:,1] - grid_origin[1]) / grid_resolution).astype(np.intp)
+    inside = (ix >= 0) & (ix < grid.shape[1]) & (iy >= 0) & (iy < grid.shape[0])
+    out = np.full([len(points)], fill, dtype=np.result_type(grid, fill))
+    out[inside] = grid[iy[inside], ix[inside]]
+    return out
+
+def euclidean_distance_transform(free, resolution=1.0):
+    ## distance from each True cell of a [y, x] bool grid to the nearest False cell, 0 on False cells, inf if there is none.
+    ## scipy.ndimage is used when installed; otherwise a column scan followed by a row-wise lower envelope
+    free = np.asarray(free, dtype=bool)
+    if free.all():
+        return np.full(free.shape, np.inf)
+    try:
+        from scipy.ndimage import distance_transform_edt
+    except ImportError:
+        distance_transform_edt = None
+    if distance_transform_edt is not None:
+        return distance_transform_edt(free, sampling=resolution)
+
+    h, w = free.shape
+    g = np.where(free, np.inf, 0.0) ## cells to the nearest False cell of the same column
+    for y in range(1, h):
+        g[y] = np.where(free[y], g[y-1] + 1, 0)
+    for y in range(h-2, -1, -1):
+        g[y] = np.minimum(g[y], g[y+1] + 1)
+    g2 = g**2
+    xs = np.arange(w)
+    d2 = np.full(free.shape, np.inf)
+    for x in range(w):
+        np.minimum(d2, g2[:,x:x+1] + (xs - x)**2, out=d2)
+    return np.sqrt(d2) * resolution
+
+## 8-connected moves (dy, dx, cost in cells)
+GRID_MOVES = [(dy, dx, np.hypot(dy, dx)) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy != 0 or dx != 0]
+
+def geodesic_distance(free, sources, resolution=1.0):
+    ## shortest 8-connected path length through True cells of a [y, x] bool grid from the nearest of the (K,2) [iy, ix] sources;
+    ## diagonal moves may not cut obstacle corners. inf where unreachable.
+    ## every step relaxes the whole wavefront at once, so the python loop runs about once per cell of path length
+    free = np.asarray(free, dtype=bool)
+    h, w = free.shape
+    flat_free = free.ravel()
+    dist = np.full([h*w], np.inf)
+    sources = np.asarray(sources, dtype=np.intp).reshape(-1,2)
+    sources = sources[(sources[:,0] >= 0) & (sources[:,0] < h) & (sources[:,1] >= 0) & (sources[:,1] < w)]
+    active = np.unique(sources[:,0]*w + sources[:,1])
+    dist[active] = 0
+
+    while len(active) > 0:
+        ay, ax = np.divmod(active, w)
+        cells = list()
+        values = list()
+        for dy, dx, cost in GRID_MOVES:
+            ny = ay + dy
+            nx = ax + dx
+            ok = (ny >= 0) & (ny < h) & (nx >= 0) & (nx < w)
+            n = ny[ok]*w + nx[ok]
+            ok_n = flat_free[n]
+            if dy != 0 and dx != 0:
+                ok_n &= flat_free[ny[ok]*w + ax[ok]] & flat_free[ay[ok]*w + nx[ok]]
+            d = dist[active[ok]] + cost
+            ok_n &= d < dist[n]
+            cells.append(n[ok_n])
+            values.append(d[ok_n])
+        cells = np.concatenate(cells)
+        values = np.concatenate(values)
+        ## a cell reached from several active cells keeps its shortest distance
+        order = np.lexsort((values, cells))
+        cells = cells[order]
+        values = values[order]
+        first = np.r_[True, cells[1:] != cells[:-1]] if len(cells) > 0 else np.zeros([0], dtype=bool)
+        active = cells[first]
+        dist[active] = values[first]
+    return dist.reshape(h, w) * resolution
 
 def get_extended_face(face_vertices, length):
     face_bottom = np.copy(face_vertices)
     face_bottom[:,2] += length
     return np.concatenate([face_vertices, face_bottom])
     
+def close_pairs(points, distance):
+    ## (i, j) index arrays, i < j, of the (N,d) points closer than distance.
+    ## spatial hash over the first two coordinates with cells of side distance, so only the 3x3 neighbouring cells are compared
+    points = np.asarray(points, dtype=float)
+    if len(points) < 2 or distance <= 0:
+        return np.zeros([0], dtype=np.intp), np.zeros([0], dtype=np.intp)
+    cells = np.floor(points[:,:2] / distance).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    width = cells[:,1].max() + 2
+    keys = cells[:,0] * width + cells[:,1]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    ii = list()
+    jj = list()
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour = keys + dx*width + dy
+            lo = np.searchsorted(sorted_keys, neighbour, 'left')
+            counts = np.searchsorted(sorted_keys, neighbour, 'right') - lo
+            total = counts.sum()
+            if total == 0:
+                continue
+            i = np.repeat(np.arange(len(points)), counts)
+            j = order[np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(total)]
+            keep = i < j
+            ii.append(i[keep])
+            jj.append(j[keep])
+    i = np.concatenate(ii)
+    j = np.concatenate(jj)
+    close = np.linalg.norm(points[i] - points[j], axis=1) < distance
+    return i[close], j[close]
+
+def distance_filtered_mask(coords, distance=0.01):
+    ## bool mask of the coords to keep: walking in order, a vertex is dropped when it is closer than distance to a kept one
+    coords = np.asarray(coords, dtype=float)
+    keep = np.ones([len(coords)], dtype=bool)
+    i, j = close_pairs(coords, distance)
+    if len(i) == 0:
+        return keep
+    order = np.argsort(i, kind='stable')
+    i = i[order]
+    j = j[order]
+    starts = np.flatnonzero(np.r_[True, i[1:] != i[:-1]])
+    ends = np.r_[starts[1:], len(i)]
+    ## only vertices with a later close neighbour need visiting, in index order
+    for a, b in zip(starts, ends):
+        if keep[i[a]]:
+            keep[j[a:b]] = False
+    return keep
+
 def distance_filtered_poly(polygon, distance=0.01):
+    from shapely.geometry import Polygon
     c = np.round(polygon.exterior.coords, 3)
-    ban = np.zeros([len(c)], dtype=int)
-    for i in range(len(c)):
-        if not ban[i]:
-            n = np.linalg.norm(c-c[i], axis=1) < distance
-            n[i] = False
-            ban = np.logical_or(ban, n) 
-    
-    return Polygon(c[np.logical_not(ban)])
+    return Polygon(c[distance_filtered_mask(c, distance)])
 
 def get_initial_vec_from_model_collision(model):
     col = model.get_link_by_name(model.name).collisions[0]
     return col.pose.position
 
 def get_corrected_poly_with_model(target_poly, model):
+    import shapely.affinity
     col_vec = get_initial_vec_from_model_collision(model)
     corrected = shapely.affinity.affine_transform(target_poly, matrix=[1,0,0,1,col_vec[0],col_vec[1]])
     return corrected
@@ -60,15 +307,19 @@ def get_corrected_mesh_from_model(model):
     return c_mesh
 
 def get_poly_from_model(model, mesh_slice_height): ## height; ROOM_WALL_HEIGHT/2
+    import trimesh
     c_mesh = get_corrected_mesh_from_model(model)
     poly = trimesh.path.polygons.projected(c_mesh, (0,0,mesh_slice_height))
     return poly
 
 def get_interior_poly_from_extrude_mesh(mesh, mesh_slice_height):
+    import trimesh
+    from shapely.geometry import Polygon
     extrude_poly = trimesh.path.polygons.projected(mesh, (0,0,mesh_slice_height))
     return distance_filtered_poly(Polygon(extrude_poly.interiors[0]))
 
 def get_interior_poly_from_extrude_model(model, mesh_slice_height):
+    from shapely.geometry import Polygon
     extrude_poly = get_poly_from_model(model, mesh_slice_height)
     extrude_interior_poly = distance_filtered_poly(Polygon(extrude_poly.interiors[0])) #-
     return extrude_interior_poly
\ No newline at end of file
@@ -0,0 +1,130 @@
+import os
+import json
+import numpy as np
+
+## per sample metadata: index of the item (room) it came from and the origin it was rendered at
+INDEX_DTYPE = np.dtype([('item', np.int64), ('x', np.float64), ('y', np.float64), ('yaw', np.float64)])
+
+class OccupancyGridWriter(object):
+    ## Streams occupancy grids of (room, origins) items into preallocated .npy memmaps in `directory`:
+    ## grids.npy (capacity, map_size, map_size) uint8, index.npy (capacity,) INDEX_DTYPE and meta.json.
+    ## Grids are written chunk_size at a time, so memory stays at one chunk whatever the dataset size.
+    ## meta.json is rewritten after every chunk with a restart point at an item boundary; reopening
+    ## the directory resumes there and write() skips the items already stored.
+
+    def __init__(self, directory, capacity, resolution=0.050, map_size=512, chunk_size=64, pass_color=255, obs_color=0):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.meta_path = os.path.join(directory, 'meta.json')
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r') as f:
+                self.meta = json.load(f)
+            mode = 'r+'
+        else:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.meta = dict(
+                capacity=capacity,
+                resolution=resolution,
+                map_size=map_size,
+                pass_color=pass_color,
+                obs_color=obs_color,
+                count=0,
+                items_done=0
+            )
+            mode = 'w+'
+
+        map_size = self.meta['map_size']
+        self.grids = np.lib.format.open_memmap(
+            os.path.join(directory, 'grids.npy'), mode=mode, dtype=np.uint8,
+            shape=(self.meta['capacity'], map_size, map_size)
+        )
+        self.index = np.lib.format.open_memmap(
+            os.path.join(directory, 'index.npy'), mode=mode, dtype=INDEX_DTYPE,
+            shape=(self.meta['capacity'],)
+        )
+        if mode == 'w+':
+            self._save_meta()
+
+        ## everything past meta['count'] is from an unfinished run and gets overwritten
+        self.count = self.meta['count']
+        self.restart_count = self.meta['count']
+        self.restart_items = self.meta['items_done']
+        self.buffer = np.empty([chunk_size, map_size, map_size], dtype=np.uint8)
+        self.buffer_index = np.empty([chunk_size], dtype=INDEX_DTYPE)
+        self.buffered = 0
+
+    @property
+    def items_done(self):
+        return self.meta['items_done']
+
+    def write(self, items, start=0):
+        ## items: iterable of (room, origins (k,3) [x, y, yaw]); the first one is item number `start`.
+        ## items below items_done were stored by an earlier run and are skipped.
+        self._rewind()
+        for item, (room, origins) in enumerate(items, start):
+            if item < self.restart_items:
+                continue
+            origins = np.asarray(origins, dtype=float).reshape(-1,3)
+            if self.count + len(origins) > self.meta['capacity']:
+                raise ValueError('writer capacity {} exceeded by item {}'.format(self.meta['capacity'], item))
+
+            for s in range(0, len(origins), self.chunk_size):
+                o = origins[s:s+self.chunk_size]
+                grids = room.get_cached_occupancy_grids(
+                    o, self.meta['resolution'], self.meta['map_size'], self.meta['pass_color'], self.meta['obs_color']
+                )
+                k = 0
+                while k < len(o):
+                    n = min(len(o) - k, self.chunk_size - self.buffered)
+                    self.buffer[self.buffered:self.buffered+n] = grids[k:k+n]
+                    b = self.buffer_index[self.buffered:self.buffered+n]
+                    b['item'] = item
+                    b['x'], b['y'], b['yaw'] = o[k:k+n,0], o[k:k+n,1], o[k:k+n,2]
+                    self.buffered += n
+                    self.count += n
+                    k += n
+                    if self.buffered == self.chunk_size:
+                        self._flush()
+            self.restart_count = self.count
+            self.restart_items = item+1
+        self._flush()
+
+    def close(self):
+        self._flush()
+        del self.grids
+        del self.index
+
+    def _rewind(self):
+        ## drop the samples of an item that an earlier write() did not finish
+        drop = self.count - self.restart_count
+        self.buffered = max(0, self.buffered - drop)
+        self.count = self.restart_count
+
+    def _flush(self):
+        ## meta only advances to the last completed item, so a resume rewrites a partially stored item from its first sample
+        start = self.count - self.buffered
+        self.grids[start:self.count] = self.buffer[:self.buffered]
+        self.index[start:self.count] = self.buffer_index[:self.buffered]
+        self.grids.flush()
+        self.index.flush()
+        self.buffered = 0
+        self.meta['count'] = self.restart_count
+        self.meta['items_done'] = self.restart_items
+        self._save_meta()
+
+    def _save_meta(self):
+        ## replace, so an interruption never leaves a half written meta.json
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+def load_grid_dataset(directory):
+    ## (grids, index, meta) of a writer directory; arrays are read-only memmaps cut to the stored samples
+    with open(os.path.join(directory, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+    grids = np.load(os.path.join(directory, 'grids.npy'), mmap_mode='r')
+    index = np.load(os.path.join(directory, 'index.npy'), mmap_mode='r')
+    return grids[:meta['count']], index[:meta['count']], meta
@@ -0,0 +1,141 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+class _NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_null_span = _NullSpan()
+
+class Instrumentation(object):
+    ## No-op default: span() returns a shared do-nothing context manager and count() ignores its arguments.
+
+    def span(self, name):
+        return _null_span
+
+    def count(self, name, value=1):
+        pass
+
+class _Span(object):
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, time.time() - self.start)
+        return False
+
+class Metrics(Instrumentation):
+    ## Aggregates span durations (count, total, max) and counters, and forwards every event to the exporters.
+    ## exporters: objects with span(name, seconds) and count(name, value)
+
+    def __init__(self, exporters=()):
+        self.exporters = list(exporters)
+        self.spans = OrderedDict() ## name: [count, total seconds, max seconds]
+        self.counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        with self._lock:
+            s = self.spans.setdefault(name, [0, 0.0, 0.0])
+            s[0] += 1
+            s[1] += seconds
+            s[2] = max(s[2], seconds)
+        for e in self.exporters:
+            e.span(name, seconds)
+
+    def count(self, name, value=1):
+        if value == 0:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for e in self.exporters:
+            e.count(name, value)
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+
+    def summary(self):
+        with self._lock:
+            return dict(
+                spans=dict((k, dict(count=v[0], total=v[1], max=v[2], mean=v[1]/v[0])) for k, v in self.spans.items()),
+                counters=dict(self.counters)
+            )
+
+    def prometheus_text(self, prefix='roomor'):
+        ## Prometheus text exposition format of the aggregated spans and counters
+        lines = list()
+        with self._lock:
+            spans = list(self.spans.items())
+            counters = list(self.counters.items())
+        if len(spans) > 0:
+            lines.append('# TYPE {}_span_seconds summary'.format(prefix))
+            for name, (c, total, _) in spans:
+                lines.append('{}_span_seconds_sum{{span="{}"}} {!r}'.format(prefix, name, total))
+                lines.append('{}_span_seconds_count{{span="{}"}} {}'.format(prefix, name, c))
+            lines.append('# TYPE {}_span_seconds_max gauge'.format(prefix))
+            for name, (_, _, m) in spans:
+                lines.append('{}_span_seconds_max{{span="{}"}} {!r}'.format(prefix, name, m))
+        for name, v in counters:
+            metric = '{}_{}_total'.format(prefix, name)
+            lines.append('# TYPE {} counter'.format(metric))
+            lines.append('{} {}'.format(metric, v))
+        return '\n'.join(lines) + '\n'
+
+class LoggingExporter(object):
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger if logger is not None else logging.getLogger('roomor')
+        self.level = level
+
+    def span(self, name, seconds):
+        self.logger.log(self.level, '%s took %.6f sec', name, seconds)
+
+    def count(self, name, value):
+        self.logger.log(self.level, '%s += %s', name, value)
+
+class CallbackExporter(object):
+    ## callback(kind, name, value) with kind 'span' (value in seconds) or 'count'
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def span(self, name, seconds):
+        self.callback('span', name, seconds)
+
+    def count(self, name, value):
+        self.callback('count', name, value)
+
+_instrumentation = Instrumentation()
+
+def set_instrumentation(instrumentation):
+    ## process-wide; None restores the no-op default. returns the previous one
+    global _instrumentation
+    previous = _instrumentation
+    _instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+    return previous
+
+def get_instrumentation():
+    return _instrumentation
+
+def span(name):
+    return _instrumentation.span(name)
+
+def count(name, value=1):
+    _instrumentation.count(name, value)
@@ -0,0 +1,74 @@
+import numpy as np
+
+from .geometric_util import square_footprints
+
+def polygon_segments(polygons):
+    ## (M,4) [x0, y0, x1, y1] edges of every ring of the shapely polygons (or multipolygons)
+    rings = list()
+    for p in polygons:
+        for g in getattr(p, 'geoms', [p]):
+            for ring in [g.exterior] + list(g.interiors):
+                c = np.asarray(ring.coords)[:,:2]
+                rings.append(np.concatenate([c[:-1], c[1:]], axis=1))
+    return np.concatenate(rings) if len(rings) > 0 else np.zeros([0,4])
+
+class LidarSimulator(object):
+    ## Gazebo-free 2D laser scans against line segments, e.g. LidarSimulator.from_room(room).scan(poses).
+    ## Beams are laid out like sensor_msgs/LaserScan: angles = linspace(angle_min, angle_max, beams) from the robot's heading.
+    ## Beams with no hit within [range_min, range_max] read no_hit.
+
+    def __init__(self, segments, beams=360, angle_min=-np.pi, angle_max=None, range_min=0.0, range_max=10.0,
+                 no_hit=np.inf, noise_std=0.0, chunk_elements=1<<22):
+        self.segments = np.asarray(segments, dtype=float).reshape(-1,4)
+        if angle_max is None:
+            ## a full turn without the beam at angle_min + 2pi
+            angle_max = angle_min + 2*np.pi*(beams-1)/beams
+        self.angles = np.linspace(angle_min, angle_max, beams)
+        self.range_min = range_min
+        self.range_max = range_max
+        self.no_hit = no_hit
+        self.noise_std = noise_std
+        self.chunk_elements = chunk_elements ## cap of poses x beams x segments per vectorized step
+
+    @classmethod
+    def from_room(cls, room, extra_tags=(), **kwargs):
+        ## segments of room.get_obstacle_footprints() (wall and obstacles) plus the models of extra_tags, sized by room.<tag>_size.
+        ## targets and keys spawn without collision, so Gazebo lasers do not see them; pass extra_tags=('target',) to include them
+        footprints = list(room.get_obstacle_footprints())
+        for tag in extra_tags:
+            footprints.extend(square_footprints(room.get_poses(tag), getattr(room, tag+'_size')))
+        return cls(polygon_segments(footprints), **kwargs)
+
+    def scan(self, poses, random_state=None):
+        ## (N,3) [x, y, yaw] robot poses -> (N, beams) ranges
+        poses = np.asarray(poses, dtype=float).reshape(-1,3)
+        beams = len(self.angles)
+        ranges = np.full([len(poses), beams], np.inf)
+        if len(self.segments) > 0:
+            step = max(1, self.chunk_elements // (beams * len(self.segments)))
+            for start in range(0, len(poses), step):
+                ranges[start:start+step] = self._cast(poses[start:start+step])
+
+        if self.noise_std > 0:
+            rng = np.random if random_state is None else random_state
+            ranges += rng.normal(0, self.noise_std, ranges.shape)
+        ranges[~((ranges >= self.range_min) & (ranges <= self.range_max))] = self.no_hit
+        return ranges
+
+    def _cast(self, poses):
+        ## nearest hit distance of each pose x beam over every segment, inf on a miss
+        a = self.segments[:,:2]
+        e = self.segments[:,2:] - a
+        theta = poses[:,2:3] + self.angles ## (N,B)
+        dx = np.cos(theta)[:,:,np.newaxis]
+        dy = np.sin(theta)[:,:,np.newaxis]
+        ## origin + t*d = a + u*e, solved with 2D cross products
+        apx = (a[:,0] - poses[:,0:1])[:,np.newaxis,:] ## (N,1,M)
+        apy = (a[:,1] - poses[:,1:2])[:,np.newaxis,:]
+        denom = dx*e[:,1] - dy*e[:,0] ## (N,B,M)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (apx*e[:,1] - apy*e[:,0]) / denom
+            u = (apx*dy - apy*dx) / denom
+        ## the nearest surface blocks the beam even when it is closer than range_min; scan maps such ranges to no_hit
+        hit = (denom != 0) & (t >= 0) & (u >= 0) & (u <= 1)
+        return np.where(hit, t, np.inf).min(axis=2)
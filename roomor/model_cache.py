@@ -0,0 +1,150 @@
+import copy
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+
+class LRUCache(object):
+    
+    def __init__(self, maxsize=16, maxbytes=None):
+        ## maxbytes caps the summed nbytes of the values (e.g. numpy arrays); None leaves only the item count cap
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        if key in self._items:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        if key in self._items:
+            self.nbytes -= _nbytes(self._items[key])
+        self._items[key] = value
+        self._items.move_to_end(key)
+        self.nbytes += _nbytes(value)
+        while len(self._items) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes and len(self._items) > 1):
+            _, evicted = self._items.popitem(last=False)
+            self.nbytes -= _nbytes(evicted)
+
+    def clear(self):
+        self._items.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / float(total) if total > 0 else 0.0
+
+    def info(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            size=len(self._items),
+            maxsize=self.maxsize,
+            nbytes=self.nbytes,
+            maxbytes=self.maxbytes,
+            hit_rate=self.hit_rate
+        )
+
+def _nbytes(value):
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return getattr(value, 'nbytes', 0)
+
+def config_digest(value):
+    ## stable hash of a creator config; the model name is left out so renamed instances share a digest
+    h = hashlib.sha1()
+    _update_digest(h, value)
+    return h.hexdigest()
+
+def _update_digest(h, value):
+    if isinstance(value, dict):
+        h.update(b'{')
+        for k in sorted(value.keys(), key=str):
+            if k == 'name':
+                continue
+            h.update(repr(k).encode())
+            _update_digest(h, value[k])
+        h.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        h.update(b'[')
+        for v in value:
+            _update_digest(h, v)
+        h.update(b']')
+    elif isinstance(value, np.ndarray):
+        h.update(repr((value.dtype.str, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif hasattr(value, 'wkb'):
+        h.update(value.wkb)
+    else:
+        h.update(repr(value).encode())
+
+def _shared_geometries(model):
+    ## collision/visual geometry objects of a model's links; they are never modified after the model is built
+    shared = list()
+    for link in model.links.values():
+        for element in list(getattr(link, 'collisions', [])) + list(getattr(link, 'visuals', [])):
+            geometry = getattr(element, 'geometry', None)
+            if geometry is not None:
+                shared.append(geometry)
+    return shared
+
+def clone_model(model):
+    ## deepcopy of a pcg model that shares its geometries (e.g. the wall's extruded mesh) with the original,
+    ## so a clone costs its poses and properties, not another copy of every mesh
+    return copy.deepcopy(model, dict((id(g), g) for g in _shared_geometries(model)))
+
+def rename_model(model, name):
+    ## creators name single-link models' link after the model (e.g. extrude walls); keep that link named like the model
+    old = model.name
+    model.name = name
+    if old != name and old in model.links:
+        link = model.links.pop(old)
+        link.name = name
+        model.links[name] = link
+    return model
+
+class ModelTemplateRegistry(object):
+    ## One built model per distinct config for the whole process.
+    ## ModelManagers get their instances by cloning a template (sharing its geometries) and renaming the clone.
+
+    def __init__(self, maxsize=64):
+        self.templates = LRUCache(maxsize)
+        self._lock = threading.Lock()
+
+    def get_template(self, config, build):
+        key = config_digest(config)
+        with self._lock:
+            template = self.templates.get(key)
+        if template is not None:
+            return template
+        ## built outside the lock so managers building different templates (e.g. several walls) do not wait on each other;
+        ## when two threads build the same one, the first inserted wins
+        built = build(config)
+        with self._lock:
+            template = self.templates.get(key)
+            if template is None:
+                template = built
+                self.templates.put(key, template)
+        return template
+
+    def instantiate(self, config, names, build):
+        template = self.get_template(config, build)
+        return [rename_model(clone_model(template), name) for name in names]
+
+template_registry = ModelTemplateRegistry()
@@ -1,43 +1,167 @@
 import copy
-from pcg_gazebo.simulation.properties.pose import Pose
-from pcg_gazebo.generators.creators import create_models_from_config
-from multiprocessing import Process
+import time
+import functools
+import numpy as np
+from collections import namedtuple
+from .geometric_util import euler_to_quaternion
+from .model_cache import LRUCache, template_registry, clone_model, rename_model
+from . import instrumentation
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError, FIRST_COMPLETED, wait
+
+## pcg_gazebo (and asyncio) are imported where they are used, so importing roomor does not load them
+
+def _quaternions(orientations):
+    ## (N,3) [roll, pitch, yaw] or (N,4) [qx, qy, qz, qw] -> (N,4) [qx, qy, qz, qw]
+    return euler_to_quaternion(orientations) if orientations.shape[1] == 3 else orientations
+
+## read-only pairing of a modelspace model (shared, not copied) with its composed world pose
+ModelPoseView = namedtuple('ModelPoseView', ['model', 'pose'])
 
 class ModelManager(): ## orientation: [roll, pitch, yaw] (degrees) or [qx, qy, qz, qw] (quaternion)
     
     namespace = 0
+    sdf_version = '1.6' ## of the model XML sent to spawn_sdf_model
+
+    executor_types = dict(
+        thread=ThreadPoolExecutor,
+        process=ProcessPoolExecutor
+    )
     
-    def __init__(self, gazebo_proxy):
+    def __init__(self, gazebo_proxy, executor_type='thread', max_workers=8, call_timeout=None, reconcile=False, batch_publisher=None,
+                 model_cache_size=16):
+        assert executor_type in ModelManager.executor_types, \
+            'executor_type must be one of {}'.format(list(ModelManager.executor_types.keys()))
+        ## without reconcile every model is respawned, so there are no moves to publish
+        assert batch_publisher is None or reconcile, 'batch_publisher is only used with reconcile=True'
         self.gazebo_proxy = gazebo_proxy
         self.namespace = ModelManager.namespace
         ModelManager.namespace += 1
         self.configspaces = dict()
         self.modelspaces = dict()
+
+        ## spawn/delete calls are fanned out to a pool that lives as long as the manager.
+        ## 'process' pickles the call targets, so the gazebo proxy has to be picklable for it.
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        ## seconds one gazebo call may run, counted from when it starts, not while it is queued behind max_workers others
+        self.call_timeout = call_timeout
+        self._executor = None
+
+        ## reconcile: move models already in the world and only spawn/delete the count difference
+        self.reconcile = reconcile
+        self.stale_tags = set() ## tags whose modelspace was rebuilt after the last spawn
+        self.spawned_counts = dict() ## tag: model count of its last apply
+        self.merge_sources = dict() ## merged tag: [(source tag, models, positions, orientations)] of its last merge
+
+        ## batch_publisher(names, positions(N,3), quaternions(N,4)) sends every move of apply_models at once.
+        ## when None, or when it returns False (e.g. ModelStatesPublisher without subscribers), each move is a separate set_model_state call.
+        self.batch_publisher = batch_publisher
+
+        ## built modelspaces keyed by (tag, cache_key, count, disable_collision); see set_modelspace_from_config
+        self.model_cache = LRUCache(model_cache_size)
+        self.modelspace_keys = dict()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ModelManager.executor_types[self.executor_type](max_workers=self.max_workers)
+        return self._executor
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
     
     def is_set_modelspace(self, tag):
         return tag in self.modelspaces.keys()
         
-    def set_modelspace_from_config(self, tag, config, max_model_count, disable_collision=False):
-        configs = [copy.deepcopy(config)[0] for _ in range(max_model_count)]
-        for i in range(max_model_count):
-            configs[i]['args']['name'] = "mm-{}-{}_{}".format(self.namespace, tag, i)
+    def set_modelspace_from_config(self, tag, config, max_model_count, disable_collision=False, cache_key=None):
+        if cache_key is not None:
+            key = (tag, cache_key, max_model_count, disable_collision)
+            cached = self.model_cache.get(key)
+            if cached is not None:
+                if self.modelspace_keys.get(tag) != key:
+                    self.stale_tags.add(tag)
+                self.configspaces[tag], self.modelspaces[tag] = cached
+                self.modelspace_keys[tag] = key
+                return
+        else:
+            key = None
+
+        names = [self._model_name(tag, i) for i in range(max_model_count)]
+        configs = [dict(config[0], args=dict(config[0]['args'], name=n)) for n in names]
         
         self.configspaces[tag] = configs
-        models = create_models_from_config(configs)
+        with instrumentation.span('modelspace.build'):
+            models = template_registry.instantiate(config[0], names, ModelManager._build_template)
         
         if disable_collision:
             for m in models:
                 m.get_link_by_name('link').disable_collision()
         
         self.modelspaces[tag] = models
+        self.modelspace_keys[tag] = key
+        self.stale_tags.add(tag)
+        if key is not None:
+            self.model_cache.put(key, (configs, models))
         
+    @staticmethod
+    def _build_template(config):
+        from pcg_gazebo.generators.creators import create_models_from_config
+        return create_models_from_config([copy.deepcopy(config)])[0]
+
     def set_modelspace_from_models(self, tag, models):
+        ## the modelspace list and its models may be shared with model_cache, and models with their owner,
+        ## so the models are renamed as clones in a new list
+        modelspace = list(self.modelspaces[tag])
         for i in range(len(models)):
-            models[i].name = "mm-{}-{}_{}".format(self.namespace, tag, i)
-            self.modelspaces[tag][i] = models[i]
+            modelspace[i] = clone_model(models[i])
+            rename_model(modelspace[i], self._model_name(tag, i))
+        self.modelspaces[tag] = modelspace
+        self.modelspace_keys[tag] = None
+        self.stale_tags.add(tag)
         
+    def set_modelspace_merged(self, tag, tag_poses):
+        ## one static model whose links are the links of the moved models of each (tag, positions, orientations).
+        ## it is rebuilt, and so respawned, only when a source model or pose changed since the last merge
+        sources = [
+            (src_tag, list(self.modelspaces[src_tag][:len(positions)]), np.array(positions, dtype=float), np.array(orientations, dtype=float))
+            for src_tag, positions, orientations in tag_poses
+        ]
+        if tag in self.modelspaces and self._same_sources(self.merge_sources.get(tag), sources):
+            return
+
+        self.modelspaces[tag] = [self._build_merged(tag, tag_poses)]
+        self.modelspace_keys[tag] = None
+        self.merge_sources[tag] = sources
+        self.stale_tags.add(tag)
+
+    def _build_merged(self, tag, tag_poses):
+        from pcg_gazebo.simulation import SimulationModel
+        merged = SimulationModel(name=self._model_name(tag, 0))
+        merged.static = True
+        for src_tag, positions, orientations in tag_poses:
+            for i, m in enumerate(self.get_moved_models(src_tag, positions, orientations)):
+                for link_name, link in m.links.items():
+                    ## the link pose is in the model frame, so it goes on the right of the model pose
+                    link.pose = m.pose + link.pose
+                    merged.add_link(name='{}_{}_{}'.format(src_tag, i, link_name), link=link)
+        return merged
+
+    @staticmethod
+    def _same_sources(previous, sources):
+        if previous is None or len(previous) != len(sources):
+            return False
+        for (t0, m0, p0, o0), (t1, m1, p1, o1) in zip(previous, sources):
+            if t0 != t1 or len(m0) != len(m1) or any(a is not b for a, b in zip(m0, m1)):
+                return False
+            if not (np.array_equal(p0, p1) and np.array_equal(o0, o1)):
+                return False
+        return True
+
     def get_moved_models(self, tag, positions, orientations):
-        copy_models = copy.deepcopy(self.modelspaces[tag][:len(positions)])
+        from pcg_gazebo.simulation.properties.pose import Pose
+        copy_models = [clone_model(m) for m in self.modelspaces[tag][:len(positions)]]
         
         poses = [Pose(pos=p, rot=o) for p,o in zip(positions, orientations)]
         for i in range(len(positions)):
@@ -45,6 +169,20 @@ class ModelManager(): ## orientation: [roll, pitch, yaw] (degrees) or [qx, qy, q
         
         return copy_models
     
+    def get_model_views(self, tag, positions, orientations, copy_models=False):
+        from pcg_gazebo.simulation.properties.pose import Pose
+        if copy_models:
+            return [ModelPoseView(m, m.pose) for m in self.get_moved_models(tag, positions, orientations)]
+        
+        return [
+            ModelPoseView(m, m.pose + Pose(pos=p, rot=o)) 
+            for m, p, o in zip(self.modelspaces[tag][:len(positions)], positions, orientations)
+        ]
+    
+    def is_spawned(self, tag):
+        ## whether the last apply of tag left models of it in the world
+        return self.spawned_counts.get(tag, 0) > 0
+
     def get_base_models(self, tag, count):
         return self.modelspaces[tag][0:count]
         
@@ -52,21 +190,195 @@ class ModelManager(): ## orientation: [roll, pitch, yaw] (degrees) or [qx, qy, q
         return [self.modelspaces[tag][i].pose for i in range(count)]
             
     def apply_model(self, tag, positions, orientations):
-        self._delete_other_models()
-        self._delete_models(tag, len(positions), len(self.modelspaces[tag]))
-        
+        if self.reconcile:
+            return self.apply_models([(tag, positions, orientations)])
+
+        with instrumentation.span('apply_model'):
+            with instrumentation.span('apply_model.get_model_names'):
+                model_names = list(self.gazebo_proxy.get_model_names())
+            with instrumentation.span('apply_model.delete_other'):
+                self._delete_other_models(model_names)
+            with instrumentation.span('apply_model.delete'):
+                self._gather(self._submit(self.gazebo_proxy.delete_model, self._live_model_deletes(tag, model_names)))
+            spawn_f, spawn_kwargs = self._plan_respawn(tag, positions, orientations)
+            with instrumentation.span('apply_model.spawn'):
+                return self._gather(self._submit(spawn_f, spawn_kwargs))
+
+    def apply_models(self, tag_poses):
+        ## tag_poses: [(tag, positions, orientations)]; poses may be numpy arrays of any row count
+        if not self.reconcile:
+            return [r for tag, p, o in tag_poses for r in self.apply_model(tag, p, o)]
+
+        with instrumentation.span('apply_model'):
+            with instrumentation.span('apply_model.get_model_names'):
+                model_names = list(self.gazebo_proxy.get_model_names())
+            with instrumentation.span('apply_model.delete_other'):
+                self._delete_other_models(model_names)
+
+            stale, targets, kwargs, moves = self._plan_reconcile(tag_poses, model_names)
+            if len(stale) > 0:
+                with instrumentation.span('apply_model.delete_stale'):
+                    self._gather(self._submit(self.gazebo_proxy.delete_model, stale))
+
+            with instrumentation.span('apply_model.calls'):
+                futures = self._submit(targets, kwargs)
+                if not self._publish_moves(moves):
+                    futures.extend(self._submit(*self._move_calls(moves)))
+
+                return self._gather(futures)
+
+    async def apply_model_async(self, tag, positions, orientations, semaphore=None):
+        ## awaitable apply_model; see _acall for how the gazebo calls are run
+        import asyncio
+        if self.reconcile:
+            return await self.apply_models_async([(tag, positions, orientations)], semaphore)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_workers)
+
+        with instrumentation.span('apply_model'):
+            with instrumentation.span('apply_model.delete_other'):
+                model_names = await self._acall(semaphore, self.gazebo_proxy.get_model_names, dict())
+                await self._agather(semaphore, self.gazebo_proxy.delete_model, self._other_model_deletes(model_names))
+            with instrumentation.span('apply_model.delete'):
+                await self._agather(semaphore, self.gazebo_proxy.delete_model, self._live_model_deletes(tag, model_names))
+            spawn_f, spawn_kwargs = self._plan_respawn(tag, positions, orientations)
+            with instrumentation.span('apply_model.spawn'):
+                return await self._agather(semaphore, spawn_f, spawn_kwargs)
+
+    async def apply_models_async(self, tag_poses, semaphore=None):
+        ## awaitable apply_models; at most semaphore's (default: max_workers) gazebo calls run at once
+        import asyncio
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_workers)
+        if not self.reconcile:
+            results = list()
+            for tag, p, o in tag_poses:
+                results.extend(await self.apply_model_async(tag, p, o, semaphore))
+            return results
+
+        with instrumentation.span('apply_model'):
+            with instrumentation.span('apply_model.get_model_names'):
+                model_names = list(await self._acall(semaphore, self.gazebo_proxy.get_model_names, dict()))
+            with instrumentation.span('apply_model.delete_other'):
+                await self._agather(semaphore, self.gazebo_proxy.delete_model, self._other_model_deletes(model_names))
+
+            stale, targets, kwargs, moves = self._plan_reconcile(tag_poses, model_names)
+            if len(stale) > 0:
+                with instrumentation.span('apply_model.delete_stale'):
+                    await self._agather(semaphore, self.gazebo_proxy.delete_model, stale)
+
+            with instrumentation.span('apply_model.calls'):
+                if not self._publish_moves(moves):
+                    move_targets, move_kwargs = self._move_calls(moves)
+                    targets = targets + move_targets
+                    kwargs = kwargs + move_kwargs
+                return await self._agather(semaphore, targets, kwargs)
+
+    def _plan_respawn(self, tag, positions, orientations):
+        ## spawn calls of apply_model without reconcile
         spawn_f = [None] * len(positions)
         spawn_kwargs = [None] * len(positions)
         
         for i in range(len(spawn_f)):
-            spawn_f[i] = self.modelspaces[tag][i].spawn
-            spawn_kwargs[i] = dict(
-                gazebo_proxy=self.gazebo_proxy, 
-                robot_namespace=self.modelspaces[tag][i].name,
-                pos=list(positions[i]),
-                rot=list(orientations[i])
-            )
-        self._multiprocessing(spawn_f, spawn_kwargs)
+            spawn_f[i] = self._spawn
+            spawn_kwargs[i] = dict(model=self.modelspaces[tag][i], pos=positions[i], rot=orientations[i])
+        self.stale_tags.discard(tag)
+        self.spawned_counts[tag] = len(spawn_f)
+        instrumentation.count('models_spawned', len(spawn_f))
+        return spawn_f, spawn_kwargs
+
+    def _plan_reconcile(self, tag_poses, model_names):
+        ## (stale deletes, spawn/delete call targets, their kwargs, moves) of apply_models.
+        ## the stale deletes have to finish before the calls, which may respawn the same names
+        stale = list()
+        targets = list()
+        kwargs = list()
+        moves = list() ## (tag, live indices to move, positions, orientations)
+        spawned = 0
+        for tag, positions, orientations in tag_poses:
+            count = len(positions)
+            live = self._find_live_models(tag, model_names)
+            if tag in self.stale_tags:
+                ## the models were rebuilt (e.g. a new wall shape), so the live ones can not be reused
+                stale.extend([dict(model_name=self._model_name(tag, i)) for i in live])
+                live = set()
+                self.stale_tags.discard(tag)
+
+            self.spawned_counts[tag] = count
+            moves.append((tag, [i for i in range(count) if i in live], positions, orientations))
+            for i in range(count):
+                if not i in live:
+                    targets.append(self._spawn)
+                    kwargs.append(dict(model=self.modelspaces[tag][i], pos=positions[i], rot=orientations[i]))
+                    spawned += 1
+            for i in sorted(live):
+                if i >= count:
+                    targets.append(self.gazebo_proxy.delete_model)
+                    kwargs.append(dict(model_name=self._model_name(tag, i)))
+
+        instrumentation.count('models_spawned', spawned)
+        instrumentation.count('models_deleted', len(stale) + len(targets) - spawned)
+        instrumentation.count('models_moved', sum(len(m[1]) for m in moves))
+        return stale, targets, kwargs, moves
+
+    def _spawn(self, model, pos, rot):
+        ## SimulationModel.spawn without its per call checks: it swaps any proxy that is not a GazeboProxy for a new one,
+        ## and replacing a live model looks up every model name first, which apply_model does once for all spawns
+        xml = '<sdf version="{0}">{1}</sdf>'.format(
+            self.sdf_version, model.to_sdf(type='model').to_xml_as_str(version=self.sdf_version)
+        )
+        return self.gazebo_proxy.spawn_sdf_model(model.name, xml, [float(v) for v in pos], [float(v) for v in rot])
+
+    def _move_calls(self, moves):
+        kwargs = list()
+        for tag, idx, p, o in moves:
+            if len(idx) == 0:
+                continue
+            p = np.asarray(p, dtype=float)[idx]
+            q = _quaternions(np.asarray(o, dtype=float)[idx])
+            kwargs.extend([dict(model_name=self._model_name(tag, i), pos=p[k], rot=q[k]) for k, i in enumerate(idx)])
+        return [self._set_model_state] * len(kwargs), kwargs
+
+    def _set_model_state(self, model_name, pos, rot):
+        ## GazeboProxy.move_model needs collections.Iterable (gone since python 3.10) and lists every model per call,
+        ## so moves call its /gazebo/set_model_state service directly; rot is [qx, qy, qz, qw]
+        service = self.gazebo_proxy._services['set_model_state']
+        request = service.request_class()
+        state = request.model_state
+        state.model_name = model_name
+        state.pose.position.x, state.pose.position.y, state.pose.position.z = [float(v) for v in pos]
+        state.pose.orientation.x, state.pose.orientation.y, state.pose.orientation.z, state.pose.orientation.w = [float(v) for v in rot]
+        state.reference_frame = 'world'
+        return service(request).success
+
+    def _publish_moves(self, moves):
+        ## one batch_publisher message for every moved model of every tag; False when the moves still need set_model_state calls
+        if self.batch_publisher is None:
+            return False
+        names = [self._model_name(tag, i) for tag, idx, _, _ in moves for i in idx]
+        if len(names) == 0:
+            return True
+        positions = list()
+        orientations = list()
+        for _, idx, p, o in moves:
+            if len(idx) == 0:
+                continue
+            positions.append(np.asarray(p, dtype=float)[idx])
+            orientations.append(_quaternions(np.asarray(o, dtype=float)[idx]))
+        with instrumentation.span('apply_model.publish'):
+            published = self.batch_publisher(names, np.concatenate(positions), np.concatenate(orientations))
+        return published is not False
+
+    def _find_live_models(self, tag, model_names):
+        prefix = self._model_name(tag, '')
+        live = set()
+        for m in model_names:
+            if m.startswith(prefix) and str.isdigit(m[len(prefix):]):
+                live.add(int(m[len(prefix):]))
+        return live
+
+    def _model_name(self, tag, index):
+        return "mm-{}-{}_{}".format(self.namespace, tag, index)
 
     def _is_mine_model(self, model_name):
         namespace = model_name.split("-")[1]
@@ -77,29 +389,88 @@ class ModelManager(): ## orientation: [roll, pitch, yaw] (degrees) or [qx, qy, q
         name = model_name.split("-")
         return name[0] == "mm" and str.isdigit(name[1])
 
-    def _delete_models(self, tag, start, stop):     
-        del_kwargs = [dict(model_name="mm-{}-{}_{}".format(self.namespace, tag, i)) for i in range(start, stop)]
-        self._multiprocessing(self.gazebo_proxy.delete_model, del_kwargs)
+    def _live_model_deletes(self, tag, model_names):
+        ## delete_model kwargs of every live model of tag; apply_model respawns the ones it still needs
+        del_kwargs = [dict(model_name=self._model_name(tag, i)) for i in sorted(self._find_live_models(tag, model_names))]
+        instrumentation.count('models_deleted', len(del_kwargs))
+        return del_kwargs
 
-    def _delete_other_models(self):
-        manager_models = filter(ModelManager._is_manager_model, self.gazebo_proxy.get_model_names())
+    def _delete_other_models(self, model_names=None):
+        if model_names is None:
+            model_names = self.gazebo_proxy.get_model_names()
+        self._gather(self._submit(self.gazebo_proxy.delete_model, self._other_model_deletes(model_names)))
+
+    def _other_model_deletes(self, model_names):
+        ## delete_model kwargs of the models of other managers
+        manager_models = filter(ModelManager._is_manager_model, model_names)
         other_models = filter(lambda m: not self._is_mine_model(m), manager_models)
         
         del_kwargs = [dict(model_name=m) for m in other_models]
-        self._multiprocessing(self.gazebo_proxy.delete_model, del_kwargs)
+        instrumentation.count('models_deleted', len(del_kwargs))
+        return del_kwargs
             
-    def _multiprocessing(self, targets, kwargs):
+    def _submit(self, targets, kwargs):
         if callable(targets):
             f = [targets] * len(kwargs)
         else:
             f = targets
-            
-        ps = [Process(target=f[i], kwargs=kwargs[i]) for i in range(len(kwargs))]
-        
-        for p in ps:
-            p.start()
-        for p in ps:
-            p.join()
-        while True:
-            if all([p.exitcode == 0 for p in ps]):
-                break
\ No newline at end of file
+
+        return [self.executor.submit(f[i], **kwargs[i]) for i in range(len(kwargs))]
+
+    def _gather(self, futures):
+        ## wait for every call, then re-raise the first failure instead of hanging on it.
+        ## a call's call_timeout starts once the executor runs it (observed within a poll of call_timeout/10, at most 0.1 sec)
+        timeout = self.call_timeout
+        if timeout is None:
+            wait(futures)
+            return [f.result() for f in futures]
+
+        poll = min(timeout / 10.0, 0.1)
+        started = dict()
+        pending = set(futures)
+        while len(pending) > 0:
+            now = time.time()
+            for f in pending:
+                if not f in started and f.running():
+                    started[f] = now
+            late = [f for f in pending if f in started and now - started[f] > timeout]
+            if len(late) > 0:
+                for f in pending:
+                    f.cancel()
+                raise TimeoutError('{} of {} gazebo calls ran longer than {} sec'.format(len(late), len(futures), timeout))
+            _, pending = wait(pending, timeout=poll, return_when=FIRST_COMPLETED)
+
+        return [f.result() for f in futures]
+
+    async def _acall(self, semaphore, target, kwargs):
+        ## awaits the proxy's coroutine counterpart async_<name> of target when it has one,
+        ## otherwise the blocking call runs on the manager's executor.
+        ## pcg_gazebo's GazeboProxy has no coroutine methods, so with a real proxy the calls run on the same
+        ## max_workers threads as apply_models: the *_async methods then only let the caller's event loop
+        ## keep running, they add no gazebo concurrency beyond it
+        import asyncio
+        async with semaphore:
+            coroutine = self._async_target(target)
+            if coroutine is not None:
+                call = coroutine(**kwargs)
+            else:
+                call = asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(target, **kwargs))
+            ## call_timeout counts from here, once the call holds the semaphore
+            try:
+                return await asyncio.wait_for(call, self.call_timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError('gazebo call did not finish within {} sec'.format(self.call_timeout))
+
+    async def _agather(self, semaphore, targets, kwargs):
+        import asyncio
+        if callable(targets):
+            targets = [targets] * len(kwargs)
+        return list(await asyncio.gather(*[self._acall(semaphore, t, k) for t, k in zip(targets, kwargs)]))
+
+    def _async_target(self, target):
+        if isinstance(target, functools.partial):
+            f = self._async_target(target.func)
+            return functools.partial(f, *target.args, **target.keywords) if f is not None else None
+        if getattr(target, '__self__', None) is self.gazebo_proxy:
+            return getattr(self.gazebo_proxy, 'async_' + target.__name__, None)
+        return None
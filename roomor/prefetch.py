@@ -0,0 +1,130 @@
+import time
+import pickle
+import traceback
+import multiprocessing
+import numpy as np
+from queue import Empty, Full
+from concurrent.futures import TimeoutError
+
+class _RemoteTraceback(Exception):
+    ## cause of an exception re-raised by get(), carrying the producer's traceback (like concurrent.futures.process)
+    def __init__(self, tb):
+        self.tb = tb
+
+    def __str__(self):
+        return self.tb
+
+class _Failure(object):
+    ## put on the queue instead of a result when job raised; the producer stops after it
+    def __init__(self, exc):
+        self.traceback = traceback.format_exc()
+        try:
+            pickle.dumps(exc)
+            self.exception = exc
+        except Exception:
+            self.exception = RuntimeError(repr(exc))
+
+def _produce(job, args, queue, stop_event, produced, blocked_time):
+    ## forked workers share the parent's random state, so every producer reseeds itself
+    np.random.seed()
+    while not stop_event.is_set():
+        try:
+            item = job(*args)
+        except Exception as e:
+            item = _Failure(e)
+        start = time.time()
+        while not stop_event.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                break
+            except Full:
+                continue
+        with blocked_time.get_lock():
+            blocked_time.value += time.time() - start
+        if isinstance(item, _Failure):
+            break
+        with produced.get_lock():
+            produced.value += 1
+
+class RoomPrefetcher(object):
+    ## Runs job(*args) in producer processes and keeps up to queue_size results ready for get().
+    
+    def __init__(self, job, args, queue_size=8, producers=2, timeout=None):
+        self.job = job
+        self.args = args
+        self.queue_size = queue_size
+        self.producers = producers
+        self.timeout = timeout
+        
+        self.queue = multiprocessing.Queue(maxsize=queue_size)
+        self.stop_event = multiprocessing.Event()
+        self.produced = multiprocessing.Value('l', 0)
+        self.producer_blocked_time = multiprocessing.Value('d', 0.0) ## back-pressure: time spent waiting on a full queue
+        self.consumed = 0
+        self.consumer_wait_time = 0.0
+        self.consumer_starved = 0 ## get() calls that found the queue empty
+        self.processes = []
+
+    def start(self):
+        self.stop_event.clear()
+        self.processes = [
+            multiprocessing.Process(
+                target=_produce, 
+                args=(self.job, self.args, self.queue, self.stop_event, self.produced, self.producer_blocked_time)
+            ) for _ in range(self.producers)
+        ]
+        for p in self.processes:
+            p.daemon = True
+            p.start()
+
+    def get(self, timeout=None, cancel=None):
+        ## cancel: threading.Event that ends the wait early (raising TimeoutError), e.g. when prefetch stops.
+        ## an exception of job in a producer is raised here, with the producer's traceback as its cause
+        if timeout is None:
+            timeout = self.timeout
+        start = time.time()
+        try:
+            item = self.queue.get_nowait()
+        except Empty:
+            self.consumer_starved += 1
+            item = None
+            while item is None:
+                wait = None if timeout is None else timeout - (time.time() - start)
+                if cancel is not None:
+                    wait = 0.1 if wait is None else min(wait, 0.1)
+                try:
+                    item = self.queue.get(timeout=max(wait, 0) if wait is not None else None)
+                except Empty:
+                    if (cancel is not None and cancel.is_set()) or (timeout is not None and time.time() - start >= timeout):
+                        raise TimeoutError('no prefetched room within {} sec'.format(timeout))
+        self.consumer_wait_time += time.time() - start
+        if isinstance(item, _Failure):
+            raise item.exception from _RemoteTraceback(item.traceback)
+        self.consumed += 1
+        return item
+
+    def stop(self, timeout=1.0):
+        self.stop_event.set()
+        ## drain so producers blocked on put can see the stop event
+        while True:
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                break
+        for p in self.processes:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+        self.processes = []
+
+    def metrics(self):
+        return dict(
+            queue_depth=self.queue.qsize(),
+            queue_size=self.queue_size,
+            producers=self.producers,
+            produced=self.produced.value,
+            consumed=self.consumed,
+            consumer_starved=self.consumer_starved,
+            consumer_wait_time=self.consumer_wait_time,
+            producer_blocked_time=self.producer_blocked_time.value
+        )
@@ -1,72 +1,441 @@
 import abc
+import random
+import functools
+import threading
 import numpy as np
-from pcg_gazebo.task_manager import GazeboProxy
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from .model_manager import ModelManager
+from .prefetch import RoomPrefetcher
+from .model_cache import LRUCache, config_digest, template_registry
+from .room_memo import RoomMemo
+from .spatial_index import RoomSpatialIndex
+from . import instrumentation
+from .geometric_util import quaternion_to_euler, xyy_to_poses, rasterize_polygon, downsample_grid, resample_grids, \
+    sample_grid, euclidean_distance_transform, geodesic_distance
+
+## rooms of generate_batch; poses['name'] is (n,k,6) with zero rows past counts['name'] (n,)
+RoomBatch = namedtuple('RoomBatch', ['rooms', 'poses', 'counts'])
+
+## randoor only draws from the process-global random states, so randoor calls of one process (e.g. the worlds of a
+## WorldScheduler generating on threads) take turns; otherwise one thread's seeding would feed another's room
+_random_lock = threading.Lock()
+
+def randoor_call(function, *args):
+    ## function(*args) of randoor outside generate_components (e.g. reposition_target), which draws from the same
+    ## global random states, so it waits its turn under _random_lock as well
+    with _random_lock:
+        return function(*args)
+
+async def run_blocking(function, *args):
+    ## awaits function(*args) on the event loop's default thread pool, so model builds, merges and randoor calls of the
+    ## *_async methods do not stall the loop. not on the model manager's executor: that one may be a process pool
+    import asyncio
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(function, *args))
+
+def seed_random(seed):
+    ## randoor draws from both random and numpy's global state
+    random.seed(seed)
+    np.random.seed(seed)
+
+def generate_components(randoor_generator, wall_thickness, pose_tags, seed=None):
+    ## everything of generate_new that does not need the model manager; picklable for prefetch and batch workers.
+    ## pose_tags: [(name, randoor tag attribute, height)]
+    ## with a seed the global random states are seeded for the randoor call and restored afterwards.
+    ## randoor's samplers, including trimesh's polygon sampler below trimesh 4 (see setup.py), draw from those states
+    with _random_lock:
+        if seed is not None:
+            states = (random.getstate(), np.random.get_state())
+            seed_random(seed)
+        try:
+            with instrumentation.span('generate_new.randoor'):
+                randoor_config = randoor_generator.generate_new()
+        finally:
+            if seed is not None:
+                random.setstate(states[0])
+                np.random.set_state(states[1])
+    
+    ## get base shape from wall polygon
+    with instrumentation.span('generate_new.wall_buffer'):
+        from shapely.geometry.polygon import Polygon
+        wall_poly = randoor_config.get_polygons(randoor_config.tag_wall)[0]
+        wall_base = Polygon(wall_poly.exterior.coords).buffer(-wall_thickness, cap_style=3, join_style=2)
+
+    xyy = dict(
+        (name, np.array(randoor_config.get_positions(getattr(randoor_config, tag)), dtype=float).reshape(-1,3))
+        for name, tag, _ in pose_tags
+    )
+    
+    return dict(
+        randoor_config=randoor_config,
+        wall_base=wall_base,
+        xyy=xyy
+    )
             
 class RoomGeneratorFactory(object):
 
-    def __init__(self, ros_host="localhost", ros_port=11311, gazebo_host='localhost', gazebo_port=11345):
-        self.gazebo_proxy = GazeboProxy(
-            ros_host=ros_host,
-            ros_port=ros_port,
-            gazebo_host=gazebo_host,
-            gazebo_port=gazebo_port
+    def __init__(self, ros_host="localhost", ros_port=11311, gazebo_host='localhost', gazebo_port=11345,
+                 executor_type='thread', max_workers=8, call_timeout=None, reconcile=False, batch_publisher=None,
+                 model_cache_size=16, gazebo_proxy=None, memo_size=128, memo_dir=None):
+        ## gazebo_proxy replaces the GazeboProxy built from the host/port arguments (e.g. a FakeGazeboProxy)
+        if gazebo_proxy is None:
+            from pcg_gazebo.task_manager import GazeboProxy
+            gazebo_proxy = GazeboProxy(
+                ros_host=ros_host,
+                ros_port=ros_port,
+                gazebo_host=gazebo_host,
+                gazebo_port=gazebo_port
+            )
+        self.gazebo_proxy = gazebo_proxy
+        self.model_manager = ModelManager(
+            self.gazebo_proxy,
+            executor_type=executor_type,
+            max_workers=max_workers,
+            call_timeout=call_timeout,
+            reconcile=reconcile,
+            batch_publisher=batch_publisher,
+            model_cache_size=model_cache_size
         )
-        self.model_manager = ModelManager(self.gazebo_proxy)
         self.randoor_generator = None
+        self.room_wall_thickness = None
+        self.pose_tags = list() ## [(name, randoor tag attribute, height)]; name is the prefix of set_components_pose's arguments
+        self.prefetcher = None
+        self._warmer = None ## thread building the next prefetched room and its model templates, see start_prefetch
+        self._warmed = deque()
+        self._warm_stop = threading.Event()
+        ## components of seeded rooms; memo_dir adds an on-disk store that several workers can share
+        self.room_memo = RoomMemo(memo_size, memo_dir)
         
+    def generate_new(self, seed=None, executor=None): ## return RoomConfig
+        ## the same seed (with the same generator parameters) always gives the same room, memoized in room_memo.
+        ## executor: a concurrent.futures executor (e.g. a ProcessPoolExecutor shared by several generators) for the randoor call
+        with instrumentation.span('generate_new'):
+            if seed is None and self._warmer is not None:
+                return self._next_warmed_room()
+            with instrumentation.span('generate_new.components'):
+                if seed is None:
+                    components = self._next_components(executor)
+                else:
+                    components = self._seeded_components([seed], executor=executor)[0]
+            with instrumentation.span('generate_new.poses'):
+                poses = self._components_poses(components['xyy'])
+            return self._build_room(components, poses)
+
+    def generate_batch(self, n, seed=None, processes=None, memoize=True):
+        ## n rooms whose poses are converted in one pass over the stacked (n,k,3) randoor positions.
+        ## processes > 1 runs the randoor calls in that many worker processes.
+        ## memoize=False neither reads nor fills room_memo, e.g. for a one-off batch larger than it.
+        ## the rooms only hold poses and polygons; their models are built when a room is spawned
+        seeds = np.random.RandomState(seed).randint(0, 2**31-1, size=n)
+        components = self._seeded_components(seeds, processes, memoize=memoize)
+
+        poses = dict()
+        counts = dict()
+        for name, _, height in self.pose_tags:
+            counts[name] = np.array([len(c['xyy'][name]) for c in components], dtype=int)
+            xyy = np.zeros([n, counts[name].max() if n > 0 else 0, 3])
+            for i, c in enumerate(components):
+                xyy[i,:counts[name][i]] = c['xyy'][name]
+            poses[name] = xyy_to_poses(xyy, height)
+            poses[name][np.arange(xyy.shape[1]) >= counts[name][:,np.newaxis]] = 0
+
+        rooms = [
+            self._build_room(c, dict((name, poses[name][i,:counts[name][i]]) for name in poses.keys()), build_models=False)
+            for i, c in enumerate(components)
+        ]
+        return RoomBatch(rooms, poses, counts)
+
     @abc.abstractmethod
-    def generate_new(self): ## return RoomConfig
+    def _build_room(self, components, poses, build_models=True): ## return RoomConfig set up with poses {'name': (k,6)}
         pass
+
+    def _component_job(self): ## return (function, args) producing the picklable components of a room
+        return generate_components, (self.randoor_generator, self.room_wall_thickness, self.pose_tags)
+
+    def generator_digest(self):
+        ## identifies everything that decides the room generated from a seed
+        return config_digest(dict(
+            generator=type(self).__name__,
+            randoor=type(self.randoor_generator).__name__,
+            randoor_params=vars(self.randoor_generator),
+            wall_thickness=self.room_wall_thickness,
+            pose_tags=self.pose_tags
+        ))
+
+    def _seeded_components(self, seeds, processes=None, executor=None, memoize=True):
+        ## components of each seed from room_memo, generating (on executor, or in processes workers if > 1) and memoizing the missing ones
+        digest = self.generator_digest()
+        keys = [(digest, int(s)) for s in seeds]
+        components = [self.room_memo.get(k) if memoize else None for k in keys]
+        missing = [i for i, c in enumerate(components) if c is None]
+        if len(missing) == 0:
+            return components
+
+        job, args = self._component_job()
+        if executor is not None:
+            futures = [executor.submit(job, *(args+(keys[i][1],))) for i in missing]
+            generated = [f.result() for f in futures]
+        elif processes is not None and processes > 1 and len(missing) > 1:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                generated = list(executor.map(job, *zip(*[args+(keys[i][1],) for i in missing])))
+        else:
+            generated = [job(*(args+(keys[i][1],))) for i in missing]
+
+        for i, c in zip(missing, generated):
+            if memoize:
+                self.room_memo.put(keys[i], c)
+            components[i] = c
+        return components
+
+    def _components_poses(self, xyy):
+        return dict((name, xyy_to_poses(xyy[name], height)) for name, _, height in self.pose_tags)
+
+    @staticmethod
+    def _pose_kwargs(poses):
+        ## {'name': (k,6)} -> set_components_pose(name_poss=(k,3), name_oris=(k,3))
+        kwargs = dict()
+        for name, p in poses.items():
+            kwargs[name+'_poss'] = p[:,:3]
+            kwargs[name+'_oris'] = p[:,3:]
+        return kwargs
+
+    def _reposition(self, room_config, name, tag):
+        self._register_reposition(room_config, name, tag)
+        with instrumentation.span('reposition_{}.apply'.format(name)):
+            room_config.apply(tag)
+
+    async def _reposition_async(self, room_config, name, tag, semaphore=None):
+        self._register_reposition(room_config, name, tag)
+        with instrumentation.span('reposition_{}.apply'.format(name)):
+            await room_config.apply_async(tag, semaphore)
+
+    def _register_reposition(self, room_config, name, tag):
+        ## re-register the poses of one pose tag after randoor moved it
+        randoor_config = room_config.randoor_config
+        randoor_tag, height = [(t, h) for n, t, h in self.pose_tags if n == name][0]
+        xyy = np.array(randoor_config.get_positions(getattr(randoor_config, randoor_tag)), dtype=float).reshape(-1,3)
+        poses = xyy_to_poses(xyy, height)
+        room_config.register_positions(tag, poses[:,:3])
+        room_config.register_orientations(tag, poses[:,3:])
+
+    def start_prefetch(self, queue_size=8, producers=2, timeout=None):
+        ## generate room components ahead of time in worker processes. a thread of this process turns the next one into
+        ## a room and builds its model templates meanwhile, so generate_new only pops a ready room and spawn_all only
+        ## clones the templates into modelspaces
+        self.stop_prefetch()
+        job, args = self._component_job()
+        self.prefetcher = RoomPrefetcher(job, args, queue_size=queue_size, producers=producers, timeout=timeout)
+        self.prefetcher.start()
+        self._warm_stop.clear()
+        self._warmer = ThreadPoolExecutor(max_workers=1)
+        self._warmed.append(self._warmer.submit(self._warm_room))
+
+    def stop_prefetch(self):
+        if self._warmer is not None:
+            self._warm_stop.set()
+            self._warmer.shutdown(wait=True)
+            self._warmer = None
+            self._warmed.clear()
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.prefetcher = None
+
+    def _warm_room(self):
+        components = self.prefetcher.get(cancel=self._warm_stop)
+        room = self._build_room(components, self._components_poses(components['xyy']), build_models=False)
+        room.warm_templates()
+        return room
+
+    def _next_warmed_room(self):
+        ## the room warmed ahead of time; the next one starts warming before this one is returned
+        future = self._warmed.popleft()
+        self._warmed.append(self._warmer.submit(self._warm_room))
+        return future.result()
+
+    def _next_components(self, executor=None):
+        if self.prefetcher is not None:
+            return self.prefetcher.get()
+        job, args = self._component_job()
+        if executor is not None:
+            return executor.submit(job, *args).result()
+        return job(*args)
         
         
 class RoomConfig(object):
+
+    ## occupancy pyramid of the room's own freespace: level k has resolution occupancy_base_resolution * 2**k
+    occupancy_base_resolution = 0.025
+    occupancy_levels = 4
+    occupancy_cache_bytes = 64 << 20
     
     def __init__(self, model_manager, randoor_config):
         self.model_manager = model_manager
         self.config_tags = list()
         self.spawn_config = dict() ## 'tag': {'config_base': ~, 'positions': ~, 'orientations': ~}
+        ## poses of every tag live in one (N,6) [x, y, z, roll, pitch, yaw] buffer;
+        ## spawn_config positions/orientations are views of the first tag_counts[tag] rows of tag_slices[tag]
+        self.pose_buffer = np.zeros([0,6])
+        self.tag_slices = dict()
+        self.tag_counts = dict()
+        self.cache_keys = dict() ## 'tag': key identifying config_base for the model manager's model cache
         self.randoor_config = randoor_config
+        ## polygons used instead of the randoor config's when set, e.g. on rooms loaded by RoomDataset (randoor_config=None)
+        self.freespace_poly = None
+        self.freezone_poly = None
+        self.merged_tag = 'merged'
+        self.merge_tags = list() ## tags spawned as links of the single static model of merged_tag
+        self.occupancy_tags = list() ## tags whose pose changes invalidate the occupancy pyramid and the spatial index
+        self.occupancy_cache = LRUCache(self.occupancy_levels, maxbytes=self.occupancy_cache_bytes) ## level: (grid, origin, resolution)
+        self.spatial_index = None ## RoomSpatialIndex, built by get_spatial_index
+        self.distance_fields = dict() ## level: (field, origin, resolution) of get_distance_field
+        self.target_fields = dict() ## (tag, level): (field, origin, resolution) of get_target_field
         
     @abc.abstractmethod
     def prepare_model_manager(self):
         pass
     
     def register_empty(self, tag, config_base, count):
-        self.config_tags.append(tag)
-        self.spawn_config[tag] = dict(
-            config_base=config_base,
-            positions=np.zeros([count,3]),
-            orientations=np.zeros([count,3])
-        )
+        if not tag in self.config_tags:
+            self.config_tags.append(tag)
+        self.spawn_config[tag] = dict(config_base=config_base)
+        self._reserve(tag, count)
+        self.pose_buffer[self.tag_slices[tag]] = 0
+        self.tag_counts[tag] = count
+        self._refresh_views()
     
     def register_positions(self, tag, positions):
-        self.spawn_config[tag]['positions'] = positions
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        count = len(positions)
+        self._reserve(tag, count)
+        rows = self.pose_buffer[self.tag_slices[tag]]
+        rows[self.tag_counts[tag]:count, 3:] = 0
+        rows[:count, :3] = positions
+        self.tag_counts[tag] = count
+        self._refresh_views()
+        if tag in self.occupancy_tags:
+            self.invalidate_occupancy()
+        else:
+            ## only the fields measured from this tag are stale; the occupancy raster and distance field stay
+            for key in [k for k in self.target_fields.keys() if k[0] == tag]:
+                del self.target_fields[key]
         
     def register_orientations(self, tag, orientations):
-        self.spawn_config[tag]['orientations'] = orientations
+        orientations = np.asarray(orientations, dtype=np.float64)
+        if orientations.ndim == 2 and orientations.shape[1] == 4:
+            orientations = quaternion_to_euler(orientations)
+        orientations = orientations.reshape(-1, 3)
+        self._reserve(tag, len(orientations))
+        self.pose_buffer[self.tag_slices[tag]][:len(orientations), 3:] = orientations
+        self._refresh_views()
+        if tag in self.occupancy_tags:
+            self.invalidate_occupancy()
+
+    def get_poses(self, tag):
+        ## (count,6) view of the tag's poses
+        s = self.tag_slices[tag]
+        return self.pose_buffer[s.start:s.start+self.tag_counts[tag]]
+
+    def _reserve(self, tag, capacity):
+        s = self.tag_slices.get(tag)
+        if s is not None and s.stop - s.start >= capacity:
+            return
+        
+        ## re-pack the buffer with the grown slice; every view is rebuilt by _refresh_views
+        blocks = []
+        slices = dict()
+        start = 0
+        for t in self.config_tags:
+            if t == tag:
+                old = self.pose_buffer[s] if s is not None else np.zeros([0,6])
+                block = np.zeros([capacity, 6])
+                block[:len(old)] = old
+            else:
+                block = self.pose_buffer[self.tag_slices[t]]
+            blocks.append(block)
+            slices[t] = slice(start, start+len(block))
+            start += len(block)
+        self.pose_buffer = np.concatenate(blocks) if len(blocks) > 0 else np.zeros([0,6])
+        self.tag_slices = slices
+        self.tag_counts.setdefault(tag, 0)
+
+    def _refresh_views(self):
+        for t in self.config_tags:
+            poses = self.get_poses(t)
+            self.spawn_config[t]['positions'] = poses[:, :3]
+            self.spawn_config[t]['orientations'] = poses[:, 3:]
     
     def set_modelspace_force(self, tag, disable_collision=False):
+        ## one model per reserved pose row, so a modelspace fits every room registered with the same capacity
+        s = self.tag_slices[tag]
         self.model_manager.set_modelspace_from_config(
             tag, 
             self.spawn_config[tag]['config_base'], 
-            len(self.spawn_config[tag]['positions']),
-            disable_collision=disable_collision
+            s.stop - s.start,
+            disable_collision=disable_collision,
+            cache_key=self.cache_keys.get(tag)
         )
     
     def set_modelspace(self, tag, disable_collision=False):
         if not self.model_manager.is_set_modelspace(tag):
             self.set_modelspace_force(tag, disable_collision)
+
+    def warm_templates(self):
+        ## builds the process-wide templates of this room's models (see model_cache.template_registry) without touching
+        ## the model manager, so it can run on another thread; set_modelspaces then only clones them
+        for t in self.config_tags:
+            template_registry.get_template(self.spawn_config[t]['config_base'][0], ModelManager._build_template)
+
+    def set_modelspaces(self):
+        ## modelspaces of every tag; rooms of generate_batch get them here when first spawned or applied
+        pass
+
+    def _ensure_modelspaces(self, tags):
+        if not all(self.model_manager.is_set_modelspace(t) for t in tags):
+            self.set_modelspaces()
         
     def spawn_all(self):
-        for t in self.spawn_config.keys():
-            self.apply(t)
+        with instrumentation.span('spawn_all'):
+            self.model_manager.apply_models(self._spawn_tag_poses())
+
+    async def spawn_all_async(self, semaphore=None):
+        ## awaitable spawn_all; gazebo calls run concurrently under semaphore (see ModelManager.apply_models_async)
+        with instrumentation.span('spawn_all'):
+            tag_poses = await run_blocking(self._spawn_tag_poses)
+            return await self.model_manager.apply_models_async(tag_poses, semaphore)
+
+    def _prepare_spawn(self):
+        pass
+
+    def _spawn_tag_poses(self):
+        ## every tag goes to the model manager at once, so moves of live models share one batch
+        self._prepare_spawn()
+        tag_poses = [
+            (t, self.spawn_config[t]['positions'], self.spawn_config[t]['orientations']) 
+            for t in self.spawn_config.keys() if not t in self.merge_tags
+        ]
+        if len(self.merge_tags) > 0:
+            with instrumentation.span('spawn_all.merge'):
+                self.model_manager.set_modelspace_merged(self.merged_tag, [
+                    (t, self.spawn_config[t]['positions'], self.spawn_config[t]['orientations']) for t in self.merge_tags
+                ])
+            tag_poses.append((self.merged_tag, np.zeros([1,3]), np.zeros([1,3])))
+            ## models of merged tags that are still spawned on their own get deleted
+            tag_poses.extend([(t, np.zeros([0,3]), np.zeros([0,3])) for t in self.merge_tags if self.model_manager.is_spawned(t)])
+        return tag_poses
 
     def apply(self, tag):
+        self._ensure_modelspaces([tag])
         self.model_manager.apply_model(tag, self.spawn_config[tag]['positions'], self.spawn_config[tag]['orientations'])
+
+    async def apply_async(self, tag, semaphore=None):
+        await run_blocking(self._ensure_modelspaces, [tag])
+        return await self.model_manager.apply_model_async(
+            tag, self.spawn_config[tag]['positions'], self.spawn_config[tag]['orientations'], semaphore
+        )
     
     def _get_all_moved_models(self, exclude_tags=[None]):
+        self._ensure_modelspaces([t for t in self.config_tags if not t in exclude_tags])
         moved = [
             self.model_manager.get_moved_models(
                 tag, 
@@ -80,9 +449,130 @@ class RoomConfig(object):
                 models[m.name] = m
                 
         return models
+
+    def get_model_views(self, exclude_tags=[None], copy_models=False):
+        self._ensure_modelspaces([t for t in self.config_tags if not t in exclude_tags])
+        views = {}
+        for tag in self.config_tags:
+            if tag in exclude_tags:
+                continue
+            for v in self.model_manager.get_model_views(
+                tag, 
+                self.spawn_config[tag]['positions'],
+                self.spawn_config[tag]['orientations'],
+                copy_models=copy_models
+            ):
+                views[v.model.name] = v
+
+        return views
+
+    def get_pose_array(self, exclude_tags=[None]):
+        ## (N,6) [x, y, z, roll, pitch, yaw] of every registered model, in config_tags order
+        poses = [self.get_poses(tag) for tag in self.config_tags if not tag in exclude_tags]
+        return np.concatenate(poses) if len(poses) > 0 else np.zeros([0,6])
     
     def get_freespace_poly(self):
+        if self.freespace_poly is not None:
+            return self.freespace_poly
         return self.randoor_config.get_freespace_poly()
+
+    def get_freezone_poly(self):
+        if self.freezone_poly is not None:
+            return self.freezone_poly
+        return self.randoor_config.get_freezone_poly()
         
     def get_occupancy_grid(self, freespace_poly, origin_pos=(0,0), origin_ori=0, resolution=0.050, map_size=512):
-        return self.randoor_config.get_occupancy_grid(freespace_poly, origin_pos, origin_ori, resolution, map_size)
\ No newline at end of file
+        if self.randoor_config is None:
+            origin = [[origin_pos[0], origin_pos[1], origin_ori]]
+            return self.get_occupancy_grids(freespace_poly, origin, resolution, map_size)[0].ravel()
+        return self.randoor_config.get_occupancy_grid(freespace_poly, origin_pos, origin_ori, resolution, map_size)
+
+    def invalidate_occupancy(self):
+        self.occupancy_cache.clear()
+        self.spatial_index = None
+        self.distance_fields.clear()
+        self.target_fields.clear()
+
+    def get_obstacle_footprints(self):
+        ## shapely polygons of everything a robot collides with, for the spatial index
+        return []
+
+    def get_spatial_index(self):
+        ## RoomSpatialIndex over get_freespace_poly() and get_obstacle_footprints(), kept until a pose of occupancy_tags changes
+        if self.spatial_index is None:
+            self.spatial_index = RoomSpatialIndex(self.get_freespace_poly(), self.get_obstacle_footprints())
+        return self.spatial_index
+
+    def get_occupancy_level(self, level):
+        ## (grid [y, x] bool, (x, y) center of cell [0, 0], resolution) of one pyramid level, built on first access
+        cached = self.occupancy_cache.get(level)
+        if cached is not None:
+            return cached
+        if level == 0:
+            grid, origin = rasterize_polygon(self.get_freespace_poly(), self.occupancy_base_resolution, margin=self.occupancy_base_resolution)
+            entry = (grid, origin, self.occupancy_base_resolution)
+        else:
+            base, base_origin, base_resolution = self.get_occupancy_level(0)
+            factor = 2**level
+            entry = (
+                downsample_grid(base, factor),
+                (base_origin[0] + (factor-1)*base_resolution/2, base_origin[1] + (factor-1)*base_resolution/2),
+                base_resolution * factor
+            )
+        self.occupancy_cache.put(level, entry)
+        return entry
+
+    def get_distance_field(self, level=0):
+        ## (field [y, x] of metres from each free cell to the nearest occupied one, origin, resolution) on an occupancy level
+        if not level in self.distance_fields:
+            grid, origin, resolution = self.get_occupancy_level(level)
+            self.distance_fields[level] = (euclidean_distance_transform(grid, resolution), origin, resolution)
+        return self.distance_fields[level]
+
+    def get_target_field(self, tag='target', level=0):
+        ## (field [y, x] of metres along free cells to the nearest model of tag, origin, resolution); inf where unreachable.
+        ## moving the tag's models (e.g. reposition_target) recomputes only this field on the cached occupancy level
+        key = (tag, level)
+        if not key in self.target_fields:
+            grid, origin, resolution = self.get_occupancy_level(level)
+            xy = self.get_poses(tag)[:,:2]
+            sources = np.stack([
+                np.rint((xy[:,1] - origin[1]) / resolution),
+                np.rint((xy[:,0] - origin[0]) / resolution)
+            ], axis=1)
+            self.target_fields[key] = (geodesic_distance(grid, sources, resolution), origin, resolution)
+        return self.target_fields[key]
+
+    def get_obstacle_distances(self, points, level=0):
+        ## (N,) distance field values at (N,2) [x, y] points; 0 outside the raster
+        field, origin, resolution = self.get_distance_field(level)
+        return sample_grid(field, origin, resolution, points, 0.0)
+
+    def get_target_distances(self, points, tag='target', level=0):
+        ## (N,) target field values at (N,2) [x, y] points; inf outside the raster
+        field, origin, resolution = self.get_target_field(tag, level)
+        return sample_grid(field, origin, resolution, points, np.inf)
+
+    def get_cached_occupancy_grids(self, origins, resolution=0.050, map_size=512, pass_color=255, obs_color=0):
+        ## get_occupancy_grids over the room's own freespace, served from the coarsest cached level not coarser than resolution
+        level = 0
+        while level+1 < self.occupancy_levels and self.occupancy_base_resolution * 2**(level+1) <= resolution + 1e-9:
+            level += 1
+        grid, origin, level_resolution = self.get_occupancy_level(level)
+        free = resample_grids(grid, origin, level_resolution, origins, resolution, map_size)
+        return np.where(free, np.uint8(pass_color), np.uint8(obs_color))
+
+    def get_cached_occupancy_grid(self, origin_pos=(0,0), origin_ori=0, resolution=0.050, map_size=512, pass_color=255, obs_color=0):
+        ## flat grid like get_occupancy_grid(self.get_freespace_poly(), ...), from the occupancy pyramid
+        origin = [[origin_pos[0], origin_pos[1], origin_ori]]
+        return self.get_cached_occupancy_grids(origin, resolution, map_size, pass_color, obs_color)[0].ravel()
+
+    def get_occupancy_grids(self, freespace_poly, origins, resolution=0.050, map_size=512, base_resolution=None, pass_color=255, obs_color=0):
+        ## origins: (N,3) [x, y, yaw], each used like origin_pos/origin_ori of get_occupancy_grid.
+        ## freespace_poly is rasterized once at base_resolution (default: resolution) and every grid is resampled from it.
+        ## returns (N, map_size, map_size) uint8; grid[n].ravel() is ordered like get_occupancy_grid's data
+        if base_resolution is None:
+            base_resolution = resolution
+        base, base_origin = rasterize_polygon(freespace_poly, base_resolution, margin=base_resolution)
+        free = resample_grids(base, base_origin, base_resolution, origins, resolution, map_size)
+        return np.where(free, np.uint8(pass_color), np.uint8(obs_color))
\ No newline at end of file
@@ -0,0 +1,47 @@
+import os
+import pickle
+from .model_cache import LRUCache
+
+class RoomMemo(object):
+    ## Pickled room components keyed by (generator digest, seed): an in-memory LRU plus an optional directory.
+    ## Entries are kept pickled so every get() returns a fresh copy; reposition_target mutates the randoor
+    ## config of a room and must not change the memoized one.
+
+    def __init__(self, maxsize=128, directory=None):
+        self.memory = LRUCache(maxsize)
+        self.directory = directory
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, '{}-{}.pkl'.format(*key))
+
+    def get(self, key):
+        data = self.memory.get(key)
+        if data is None and self.directory is not None and os.path.exists(self._path(key)):
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            self.memory.put(key, data)
+        return pickle.loads(data) if data is not None else None
+
+    @property
+    def enabled(self):
+        return self.memory.maxsize > 0 or self.directory is not None
+
+    def put(self, key, components):
+        if not self.enabled:
+            return
+        data = pickle.dumps(components, protocol=pickle.HIGHEST_PROTOCOL)
+        self.memory.put(key, data)
+        if self.directory is not None:
+            ## written under a temporary name so concurrent workers never read a partial file
+            tmp = '{}.{}.tmp'.format(self._path(key), os.getpid())
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+
+    def clear(self):
+        self.memory.clear()
+
+    def info(self):
+        return dict(self.memory.info(), directory=self.directory)
@@ -0,0 +1,72 @@
+import numpy as np
+
+from .geometric_util import polygon_contains_xy
+
+class RoomSpatialIndex(object):
+    ## Batched geometry queries on one room: a prepared freespace polygon and an STRtree over obstacle footprints
+    ## (RoomConfig.get_obstacle_footprints, e.g. the wall and the obstacle squares).
+    ## Every query takes (N,2) [x, y] arrays and returns (N,) arrays.
+
+    def __init__(self, freespace_poly, footprints):
+        import shapely
+        from shapely.strtree import STRtree
+        self.freespace = freespace_poly
+        self.footprints = list(footprints)
+        if hasattr(shapely, 'prepare'):
+            shapely.prepare(self.freespace)
+        self.tree = STRtree(self.footprints) if len(self.footprints) > 0 else None
+
+    def contains(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1,2)
+        return np.asarray(polygon_contains_xy(self.freespace, points[:,0], points[:,1]), dtype=bool)
+
+    def distance_to_nearest_obstacle(self, points):
+        ## 0 inside a footprint, inf when the room has none
+        import shapely
+        points = np.asarray(points, dtype=float).reshape(-1,2)
+        distance = np.full([len(points)], np.inf)
+        if self.tree is None or len(points) == 0:
+            return distance
+        if hasattr(self.tree, 'query_nearest'):
+            (i, _), d = self.tree.query_nearest(shapely.points(points), return_distance=True)
+            ## ties return several footprints for one point
+            np.minimum.at(distance, i, d)
+        else:
+            from shapely.geometry import Point
+            for k, p in enumerate(points):
+                q = Point(p)
+                distance[k] = self.tree.nearest(q).distance(q)
+        return distance
+
+    def is_free(self, points, clearance=0.0):
+        ## inside freespace and at least clearance away from every footprint
+        points = np.asarray(points, dtype=float).reshape(-1,2)
+        free = self.contains(points)
+        if clearance > 0 and free.any():
+            free[free] = self.distance_to_nearest_obstacle(points[free]) >= clearance
+        return free
+
+    def sample_free_poses(self, n, clearance=0.0, random_state=None, batch_size=None, max_batches=1000):
+        ## (n,3) [x, y, yaw] uniformly drawn over freespace with the given clearance, by batched rejection sampling.
+        ## random_state: np.random.RandomState (default: the np.random module, as seed_random seeds it)
+        rng = np.random if random_state is None else random_state
+        minx, miny, maxx, maxy = self.freespace.bounds
+        if batch_size is None:
+            ## enough candidates for n on the first batch given the freespace's share of its bounds
+            fill = self.freespace.area / max((maxx - minx) * (maxy - miny), 1e-12)
+            batch_size = max(64, int(2 * n / max(fill, 1e-3)))
+
+        found = list()
+        count = 0
+        for _ in range(max_batches):
+            if count >= n:
+                break
+            xy = np.stack([rng.uniform(minx, maxx, batch_size), rng.uniform(miny, maxy, batch_size)], axis=1)
+            xy = xy[self.is_free(xy, clearance)]
+            found.append(xy)
+            count += len(xy)
+        if count < n:
+            raise ValueError('found {} of {} free poses with clearance {}'.format(count, n, clearance))
+
+        xy = np.concatenate(found)[:n] if len(found) > 0 else np.zeros([0,2])
+        return np.concatenate([xy, rng.uniform(-np.pi, np.pi, n)[:,np.newaxis]], axis=1)
@@ -0,0 +1,152 @@
+import os
+import shutil
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from .model_cache import config_digest, template_registry, clone_model, rename_model
+
+## pcg_gazebo is only needed to write models missing from the library; no ROS or Gazebo connection is made
+
+def _pose_text(pose):
+    return ' '.join('{:.9g}'.format(v) for v in pose)
+
+class ModelLibrary(object):
+    ## Directory of Gazebo models shared by exported worlds, one per distinct creator config (see config_digest),
+    ## so every world refers to the same wall/obstacle/target models by model://<name> instead of embedding their XML.
+    ## Add the directory to GAZEBO_MODEL_PATH when starting Gazebo with the worlds.
+
+    def __init__(self, directory, sdf_version='1.6'):
+        self.directory = directory
+        self.sdf_version = sdf_version
+        self.entries = dict() ## digest: (name, (6,) pose of the model's own frame)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, config, disable_collision=False):
+        ## (model name, (6,) [x, y, z, roll, pitch, yaw] of the model's own pose) for a creator config, written on first use
+        digest = config_digest([config, disable_collision])
+        with self._lock:
+            entry = self.entries.get(digest)
+        if entry is not None:
+            return entry
+
+        from .model_manager import ModelManager
+        model = clone_model(template_registry.get_template(config, ModelManager._build_template))
+        if disable_collision:
+            model.get_link_by_name('link').disable_collision()
+        name = 'roomor_{}'.format(digest[:16])
+        path = os.path.join(self.directory, name)
+        if not os.path.isdir(path):
+            self._write_model(rename_model(model, name), path)
+
+        entry = (name, np.concatenate([model.pose.position, model.pose.rpy]).astype(float))
+        with self._lock:
+            self.entries[digest] = entry
+        return entry
+
+    def _write_model(self, model, path):
+        ## model.config, model.sdf and the model's meshes (copied in, with model:// URIs) go to a staging directory
+        ## that is renamed into place, so an entry is complete or absent and the library can be moved as a whole
+        staging = os.path.join(self.directory, '.{}.{}.{}.tmp'.format(model.name, os.getpid(), threading.get_ident()))
+        try:
+            os.makedirs(staging)
+            written = model.to_gazebo_model(
+                output_dir=staging,
+                model_metaname=model.name,
+                description='roomor model library entry',
+                sdf_version=self.sdf_version,
+                copy_resources=True,
+                overwrite=True
+            )
+            ## None when pcg_gazebo refuses to write, e.g. a model of that name is already on GAZEBO_MODEL_PATH elsewhere
+            if written is None:
+                raise RuntimeError('pcg_gazebo could not write model {} for the library at {}'.format(model.name, self.directory))
+            try:
+                os.rename(written, path)
+            except OSError:
+                ## another exporter wrote the same entry first
+                if not os.path.isdir(path):
+                    raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+class WorldExporter(object):
+    ## Writes RoomConfigs as complete .world files whose models are <include>s of a shared ModelLibrary.
+    ## Each world is streamed model by model, so exporting needs no XML tree of the whole world.
+    ## collisionless_tags are exported without collisions, as the generators spawn them (targets, keys).
+
+    def __init__(self, library_dir, world_name='default', includes=('sun', 'ground_plane'), collisionless_tags=('target', 'key'),
+                 sdf_version='1.6'):
+        self.library = ModelLibrary(library_dir, sdf_version)
+        self.world_name = world_name
+        self.includes = includes
+        self.collisionless_tags = collisionless_tags
+        self.sdf_version = sdf_version
+
+    def export(self, room, path):
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'w') as f:
+            self.write(room, f)
+        os.replace(tmp, path)
+        return path
+
+    def export_all(self, rooms, directory, name_format='room_{:06d}.world', start=0):
+        ## one world per room; returns the written paths
+        os.makedirs(directory, exist_ok=True)
+        return [self.export(r, os.path.join(directory, name_format.format(start+i))) for i, r in enumerate(rooms)]
+
+    def write(self, room, f):
+        f.write('<?xml version="1.0"?>\n<sdf version="{}">\n  <world name="{}">\n'.format(self.sdf_version, self.world_name))
+        for uri in self.includes:
+            f.write('    <include><uri>model://{}</uri></include>\n'.format(uri))
+        for tag in room.config_tags:
+            poses = room.get_poses(tag)
+            if len(poses) == 0:
+                continue
+            name, base = self.library.get(room.spawn_config[tag]['config_base'][0], tag in self.collisionless_tags)
+            for i, pose in enumerate(self._world_poses(base, poses)):
+                f.write('    <include><uri>model://{}</uri><name>{}_{}</name><pose>{}</pose></include>\n'.format(
+                    name, tag, i, _pose_text(pose)
+                ))
+        f.write('  </world>\n</sdf>\n')
+
+    @staticmethod
+    def _world_poses(base, poses):
+        ## the model's own pose composed with each room pose, as ModelManager does when spawning
+        if not np.any(base):
+            return poses
+        from pcg_gazebo.simulation.properties.pose import Pose
+        out = np.empty([len(poses), 6])
+        for i, p in enumerate(poses):
+            pose = Pose(pos=list(base[:3]), rot=list(base[3:])) + Pose(pos=list(p[:3]), rot=list(p[3:]))
+            out[i,:3] = pose.position
+            out[i,3:] = pose.rpy
+        return out
+
+def _export_dataset_range(dataset_path, directory, exporter_kwargs, name_format, start, stop):
+    from .dataset import RoomDataset
+    dataset = RoomDataset(dataset_path)
+    exporter = WorldExporter(**exporter_kwargs)
+    return [
+        exporter.export(dataset[i], os.path.join(directory, name_format.format(i)))
+        for i in range(start, stop)
+    ]
+
+def export_dataset(dataset_path, directory, library_dir, processes=None, chunk_size=256, name_format='room_{:06d}.world', **kwargs):
+    ## every room of a save_rooms file as a .world in directory; worker processes each map the file and share library_dir.
+    ## kwargs go to WorldExporter
+    from .dataset import RoomDataset
+    count = len(RoomDataset(dataset_path))
+    os.makedirs(directory, exist_ok=True)
+    exporter_kwargs = dict(kwargs, library_dir=library_dir)
+    ranges = [(s, min(s+chunk_size, count)) for s in range(0, count, chunk_size)]
+    if processes is not None and processes <= 1:
+        return [p for s, e in ranges for p in _export_dataset_range(dataset_path, directory, exporter_kwargs, name_format, s, e)]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(_export_dataset_range, dataset_path, directory, exporter_kwargs, name_format, s, e)
+            for s, e in ranges
+        ]
+        return [p for f in futures for p in f.result()]
@@ -0,0 +1,136 @@
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+## result of a spawn job: the world it ran on, the room now live there and the job's seconds
+SpawnResult = namedtuple('SpawnResult', ['job_id', 'world', 'room', 'seconds'])
+
+class World(object):
+    ## One Gazebo instance: its room generator (bound to the instance's proxy) and a single worker,
+    ## since a ModelManager reconciles one room at a time.
+
+    def __init__(self, index, generator):
+        self.index = index
+        self.generator = generator
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = 0
+        self.done = 0 ## finished jobs of any kind
+        self.spawned = 0 ## finished spawn jobs
+        self.busy_time = 0.0
+        self.room = None ## room currently spawned in this world
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+        self.generator.model_manager.shutdown(wait=wait)
+
+class WorldScheduler(object):
+    ## Shards room spawn jobs over several Gazebo instances; each job goes to the world with the fewest pending jobs.
+    ## generators: RoomGeneratorFactory instances, one per world (see from_ports)
+    ## processes: size of the process pool the worlds' randoor calls run on (default: one per world). randoor calls of
+    ## one process are serialized (see room_generator_factory._random_lock), so 0 keeps them in this process at the
+    ## cost of generating one room at a time.
+
+    def __init__(self, generators, processes=None):
+        self.worlds = [World(i, g) for i, g in enumerate(generators)]
+        if processes is None:
+            processes = len(self.worlds)
+        self.component_executor = ProcessPoolExecutor(max_workers=processes) if processes > 0 else None
+        self.placements = dict() ## id(room): world index
+        self._lock = threading.Lock()
+        self._job_id = 0
+        self._start = time.time()
+
+    @classmethod
+    def from_ports(cls, generator_cls, ports, ros_host='localhost', gazebo_host='localhost', processes=None, **kwargs):
+        ## ports: [(ros_port, gazebo_port)] of the running instances; kwargs go to every generator_cls
+        return cls([
+            generator_cls(ros_host=ros_host, ros_port=r, gazebo_host=gazebo_host, gazebo_port=g, **kwargs)
+            for r, g in ports
+        ], processes=processes)
+
+    def submit(self, seed=None):
+        ## generate a room (from seed when given) on the least busy world and spawn it there; returns a Future of SpawnResult
+        with self._lock:
+            world = min(self.worlds, key=lambda w: (w.pending, w.done))
+            return self._submit(world, lambda job_id: self._spawn_job(job_id, world, seed))
+
+    def submit_to(self, room, fn, *args):
+        ## run fn(generator, room, *args) on the world the room lives in, after its queued jobs; returns a Future of fn's result
+        world = self.worlds[self.locate(room)]
+        with self._lock:
+            return self._submit(world, lambda job_id: fn(world.generator, room, *args))
+
+    def reposition_target(self, room):
+        ## the generator's randoor call takes room_generator_factory._random_lock, so it does not race the randoor
+        ## calls of the other worlds' threads; its gazebo calls run outside the lock
+        return self.submit_to(room, lambda generator, r: generator.reposition_target(r))
+
+    def locate(self, room):
+        ## index of the world the room was spawned in
+        return self.placements[id(room)]
+
+    def map(self, seeds):
+        ## spawn one room per seed across the worlds; yields SpawnResults in seed order
+        futures = [self.submit(s) for s in seeds]
+        for f in futures:
+            yield f.result()
+
+    def _submit(self, world, job):
+        ## job(job_id) runs on the world's worker
+        self._job_id += 1
+        job_id = self._job_id
+        world.pending += 1
+
+        def run():
+            start = time.time()
+            try:
+                return job(job_id)
+            finally:
+                with self._lock:
+                    world.pending -= 1
+                    world.done += 1
+                    world.busy_time += time.time() - start
+
+        return world.executor.submit(run)
+
+    def _spawn_job(self, job_id, world, seed):
+        start = time.time()
+        room = world.generator.generate_new(seed=seed, executor=self.component_executor)
+        room.spawn_all()
+        with self._lock:
+            ## the world's previous room is no longer live
+            if world.room is not None:
+                self.placements.pop(id(world.room), None)
+            world.room = room
+            world.spawned += 1
+            self.placements[id(room)] = world.index
+        return SpawnResult(job_id, world.index, room, time.time() - start)
+
+    def metrics(self):
+        elapsed = time.time() - self._start
+        with self._lock:
+            worlds = [
+                dict(
+                    world=w.index,
+                    pending=w.pending,
+                    done=w.done,
+                    spawned=w.spawned,
+                    busy_time=w.busy_time,
+                    rooms_per_sec=w.spawned / w.busy_time if w.busy_time > 0 else 0.0
+                ) for w in self.worlds
+            ]
+        spawned = sum(w['spawned'] for w in worlds)
+        return dict(
+            worlds=worlds,
+            spawned=spawned,
+            elapsed=elapsed,
+            rooms_per_sec=spawned / elapsed if elapsed > 0 else 0.0,
+            utilization=sum(w['busy_time'] for w in worlds) / (elapsed * len(worlds)) if elapsed > 0 and len(worlds) > 0 else 0.0
+        )
+
+    def shutdown(self, wait=True):
+        for w in self.worlds:
+            w.shutdown(wait=wait)
+        if self.component_executor is not None:
+            self.component_executor.shutdown(wait=wait)
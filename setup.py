@@ -14,13 +14,12 @@ with codecs.open("README.md", "r", encoding="utf-8") as fh:
 requirements = [
     'randoor',
     'pcg_gazebo==0.7.12',
-    'trimesh'
+    ## trimesh 4 samples polygons from its own unseeded generator, so seeded rooms would not repeat
+    'trimesh>=3.9.34,<4'
 ]
 
 classifiers = [
     'License :: OSI Approved :: MIT License',
-    'Programming Language :: Python :: 2.7',
-    'Programming Language :: Python :: 3.6',
     'Programming Language :: Python :: 3.7',
     'Programming Language :: Python :: 3.8',
     'Programming Language :: Python :: 3.9',
@@ -39,5 +38,6 @@ setuptools.setup(
     packages=setuptools.find_packages(),
     classifiers=classifiers,
     keywords='gazebo ros simulation robotics randomized-environment reinforcement-learning-environments pcg_gazebo randoor',
-    install_requires=requirements
+    install_requires=requirements,
+    python_requires='>=3.7'
 )
\ No newline at end of file
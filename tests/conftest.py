@@ -0,0 +1,147 @@
+import os
+import numpy as np
+import pytest
+
+from roomor.generator import CubeRoomConfig, CubeRoomGenerator
+from roomor.room_generator_factory import RoomGeneratorFactory, _random_lock
+from roomor.geometric_util import square_footprints
+from roomor.model_manager import ModelManager
+from roomor.model_cache import template_registry
+
+## rooms are built without randoor or pcg_gazebo: freespace is set directly like RoomDataset does,
+## and the stand_in_models fixture replaces the models pcg_gazebo would build
+
+class StandInLink(object):
+    def __init__(self, name):
+        self.name = name
+        self.collisions = list()
+        self.visuals = list()
+        self.collision_enabled = True
+
+    def disable_collision(self):
+        self.collision_enabled = False
+
+class StandInSDF(object):
+    def __init__(self, name):
+        self.name = name
+
+    def to_xml_as_str(self, version='1.6'):
+        return '<model name="{}"/>'.format(self.name)
+
+class StandInPose(object):
+    def __init__(self):
+        self.position = [0.0, 0.0, 0.0]
+        self.rpy = [0.0, 0.0, 0.0]
+
+class StandInModel(object):
+    ## the parts of a pcg_gazebo SimulationModel that ModelManager and ModelLibrary use
+    def __init__(self, name):
+        self.name = name
+        self.links = dict(link=StandInLink('link'))
+        self.pose = StandInPose()
+
+    def get_link_by_name(self, name):
+        return self.links[name]
+
+    def to_sdf(self, type='model'):
+        return StandInSDF(self.name)
+
+    def to_gazebo_model(self, output_dir=None, model_metaname=None, description=None, sdf_version='1.6',
+                        copy_resources=False, overwrite=False):
+        ## pcg_gazebo asserts that output_dir exists and writes output_dir/<name>/{model.config,model.sdf}
+        assert os.path.isdir(output_dir), 'Invalid output directory, dir={}'.format(output_dir)
+        directory = os.path.join(output_dir, self.name)
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'model.config'), 'w') as f:
+            f.write('<model><name>{}</name></model>'.format(model_metaname))
+        with open(os.path.join(directory, 'model.sdf'), 'w') as f:
+            f.write('<sdf version="{}">{}</sdf>'.format(sdf_version, self.to_sdf().to_xml_as_str()))
+        return directory
+
+@pytest.fixture
+def stand_in_models(monkeypatch):
+    ## model templates are built as StandInModels; the process-wide template registry is emptied around the test
+    monkeypatch.setattr(ModelManager, '_build_template', staticmethod(lambda config: StandInModel(config['args']['name'])))
+    template_registry.templates.clear()
+    yield
+    template_registry.templates.clear()
+
+def make_cube_room(half_side=2.0, obstacles=((1.0, 1.0, 0.0),), targets=((-1.0, -1.0, 0.0),),
+                   max_obstacle_count=4, max_target_count=2, wall_thickness=0.05, obstacle_size=0.5, target_size=0.2,
+                   model_manager=None, room_class=CubeRoomConfig):
+    ## square room centered on the origin; obstacles and targets are [x, y, yaw]
+    from shapely.geometry import box
+    wall_polygon = box(-half_side, -half_side, half_side, half_side)
+    room = room_class(model_manager, None, wall_polygon, wall_thickness, 0.8,
+                          [obstacle_size, obstacle_size, 0.8], [target_size, target_size, 0.1])
+    room.register_empty(room.wall_tag, room.wall_config_base, 1)
+    room.register_empty(room.obstacle_tag, room.obstacle_config_base, max_obstacle_count)
+    room.register_empty(room.target_tag, room.target_config_base, max_target_count)
+
+    obstacles = np.asarray(obstacles, dtype=float).reshape(-1,3)
+    targets = np.asarray(targets, dtype=float).reshape(-1,3)
+    room.set_components_pose(
+        np.concatenate([obstacles[:,:2], np.full([len(obstacles),1], 0.4)], axis=1),
+        np.concatenate([np.zeros([len(obstacles),2]), obstacles[:,2:]], axis=1),
+        np.concatenate([targets[:,:2], np.full([len(targets),1], 0.05)], axis=1),
+        np.concatenate([np.zeros([len(targets),2]), targets[:,2:]], axis=1)
+    )
+
+    freespace = wall_polygon.buffer(-wall_thickness, join_style=2)
+    for f in square_footprints(room.get_poses(room.obstacle_tag), room.obstacle_size):
+        freespace = freespace.difference(f)
+    room.freespace_poly = freespace
+    room.freezone_poly = wall_polygon.buffer(-0.5, join_style=2)
+    return room
+
+@pytest.fixture
+def cube_room():
+    return make_cube_room()
+
+class StandInRandoorConfig(object):
+    ## the parts of a randoor room config that the generators read
+    tag_wall = 'wall'
+    tag_obstacle = 'obstacle'
+    tag_target = 'target'
+
+    def __init__(self, positions):
+        self.positions = positions ## tag: [[x, y, yaw]]
+        self.repositioned_locked = list() ## whether _random_lock was held in each reposition_target
+
+    def get_polygons(self, tag):
+        from shapely.geometry import box
+        return [box(-2, -2, 2, 2)]
+
+    def get_positions(self, tag):
+        return self.positions[tag]
+
+class StandInRandoorGenerator(object):
+    ## draws from numpy's global random state, like randoor
+    def __init__(self, obstacle_count=4):
+        self.obstacle_count = obstacle_count
+
+    def generate_new(self):
+        return StandInRandoorConfig(dict(
+            obstacle=np.random.uniform(-1.5, 1.5, [self.obstacle_count, 3]).tolist(),
+            target=np.random.uniform(-1.5, 1.5, [1, 3]).tolist()
+        ))
+
+    def reposition_target(self, randoor_config):
+        randoor_config.repositioned_locked.append(_random_lock.locked())
+        randoor_config.positions['target'] = np.random.uniform(-1.5, 1.5, [1, 3]).tolist()
+
+def make_cube_generator(gazebo_proxy, obstacle_count=4, **kwargs):
+    ## CubeRoomGenerator around a StandInRandoorGenerator; its constructor would build randoor's.
+    ## kwargs go to RoomGeneratorFactory
+    generator = CubeRoomGenerator.__new__(CubeRoomGenerator)
+    RoomGeneratorFactory.__init__(generator, gazebo_proxy=gazebo_proxy, **kwargs)
+    generator.obstacle_count = obstacle_count
+    generator.obstacle_size = 0.5
+    generator.target_size = 0.2
+    generator.room_wall_thickness = 0.05
+    generator.room_wall_height = 0.8
+    generator.merge_obstacles = False
+    generator.merge_wall = False
+    generator.randoor_generator = StandInRandoorGenerator(obstacle_count)
+    generator.pose_tags = [('obstacle', 'tag_obstacle', 0.25), ('target', 'tag_target', 0.1)]
+    return generator
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+from roomor.model_manager import ModelManager
+from roomor.model_cache import template_registry
+from roomor.fake_proxy import FakeGazeboProxy
+
+from conftest import make_cube_room, make_cube_generator, StandInModel
+
+def _build_threads(monkeypatch):
+    ## thread ids of the template builds
+    threads = list()
+    def build(config):
+        threads.append(threading.get_ident())
+        return StandInModel(config['args']['name'])
+    monkeypatch.setattr(ModelManager, '_build_template', staticmethod(build))
+    return threads
+
+def _local_names(proxy):
+    ## model names without the manager namespace
+    return sorted(m.split('-', 2)[2] for m in proxy.models)
+
+def test_spawn_all_async_matches_spawn_all(stand_in_models, monkeypatch):
+    sync_proxy = FakeGazeboProxy()
+    sync_manager = ModelManager(sync_proxy)
+    make_cube_room(obstacles=[(1.0, 1.0, 0.0), (-1.0, 1.0, 0.5)], model_manager=sync_manager).spawn_all()
+
+    template_registry.templates.clear()
+    threads = _build_threads(monkeypatch)
+    proxy = FakeGazeboProxy()
+    manager = ModelManager(proxy)
+    room = make_cube_room(obstacles=[(1.0, 1.0, 0.0), (-1.0, 1.0, 0.5)], model_manager=manager)
+    assert asyncio.run(room.spawn_all_async()) == [True] * 4
+    assert _local_names(proxy) == _local_names(sync_proxy)
+    assert proxy.calls['spawn_sdf_model'] == sync_proxy.calls['spawn_sdf_model']
+    ## the modelspaces were built off the event loop's thread
+    assert len(threads) > 0 and not threading.get_ident() in threads
+    manager.shutdown()
+    sync_manager.shutdown()
+
+def test_apply_async_builds_off_the_loop(stand_in_models, monkeypatch):
+    threads = _build_threads(monkeypatch)
+    proxy = FakeGazeboProxy()
+    manager = ModelManager(proxy)
+    room = make_cube_room(model_manager=manager)
+    assert asyncio.run(room.apply_async(room.target_tag)) == [True]
+    assert _local_names(proxy) == ['target_0']
+    assert len(threads) > 0 and not threading.get_ident() in threads
+    manager.shutdown()
+
+def test_reposition_target_async(stand_in_models):
+    proxy = FakeGazeboProxy()
+    generator = make_cube_generator(proxy)
+    room = generator.generate_new(seed=3)
+    asyncio.run(room.spawn_all_async())
+    before = proxy.models[generator.model_manager._model_name('target', 0)][1]
+
+    asyncio.run(generator.reposition_target_async(room))
+    after = proxy.models[generator.model_manager._model_name('target', 0)][1]
+    assert after != before
+    assert after == room.spawn_config[room.target_tag]['positions'][0].tolist()
+    ## the randoor call ran under the random lock, which only a thread other than the loop's can have taken
+    assert room.randoor_config.repositioned_locked == [True]
+    generator.model_manager.shutdown()
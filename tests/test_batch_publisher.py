@@ -0,0 +1,109 @@
+import sys
+import types
+import numpy as np
+import pytest
+
+from roomor.batch_publisher import ModelStatesPublisher
+from roomor.model_manager import ModelManager
+from roomor.fake_proxy import FakeGazeboProxy
+
+from conftest import make_cube_room
+
+class _Message(object):
+    def __init__(self):
+        self.x = self.y = self.z = 0.0
+        self.w = 1.0
+
+class _Pose(object):
+    def __init__(self):
+        self.position = _Message()
+        self.orientation = _Message()
+
+class _ModelStates(object):
+    def __init__(self):
+        self.name = list()
+        self.pose = list()
+        self.twist = list()
+
+class _Publisher(object):
+    ## stands in for rospy.Publisher; connections is the subscriber count
+    instances = list()
+
+    def __init__(self, topic, msg_class, queue_size=None):
+        self.topic = topic
+        self.connections = 0
+        self.published = list()
+        _Publisher.instances.append(self)
+
+    def get_num_connections(self):
+        return self.connections
+
+    def publish(self, msg):
+        self.published.append(msg)
+
+@pytest.fixture
+def ros_messages(monkeypatch):
+    ## rospy, gazebo_msgs and geometry_msgs are only importable on a ROS install
+    _Publisher.instances = list()
+    modules = {
+        'rospy': types.SimpleNamespace(Publisher=_Publisher),
+        'gazebo_msgs': types.ModuleType('gazebo_msgs'),
+        'gazebo_msgs.msg': types.SimpleNamespace(ModelStates=_ModelStates),
+        'geometry_msgs': types.ModuleType('geometry_msgs'),
+        'geometry_msgs.msg': types.SimpleNamespace(Pose=_Pose, Twist=object),
+    }
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+
+def test_publisher_waits_connect_timeout(ros_messages, monkeypatch):
+    publisher = ModelStatesPublisher(connect_timeout=0.1)
+    assert publisher.publisher.topic == '/gazebo/set_model_states'
+    ## no subscriber: nothing is published and the caller falls back
+    assert publisher(['a'], np.zeros([1,3]), np.array([[0, 0, 0, 1.0]])) is False
+    assert publisher.publisher.published == []
+
+    monkeypatch.setattr(ModelStatesPublisher, 'connect_timeout', 0)
+    assert ModelStatesPublisher().wait_for_subscriber() is False
+
+def test_publisher_sends_one_message(ros_messages):
+    publisher = ModelStatesPublisher(connect_timeout=0)
+    publisher.publisher.connections = 1
+    assert publisher(['a', 'b'], np.array([[1, 2, 3], [4, 5, 6.0]]), np.array([[0, 0, 0, 1], [0, 0, 1, 0.0]])) is True
+    msg, = publisher.publisher.published
+    assert msg.name == ['a', 'b']
+    assert [(p.position.x, p.position.y, p.position.z) for p in msg.pose] == [(1, 2, 3), (4, 5, 6)]
+    assert [(p.orientation.z, p.orientation.w) for p in msg.pose] == [(0, 1), (1, 0)]
+    assert len(msg.twist) == 2
+
+class _BatchPublisher(object):
+    def __init__(self, published):
+        self.published = published
+        self.calls = list()
+
+    def __call__(self, names, positions, quaternions):
+        self.calls.append((names, positions, quaternions))
+        return self.published
+
+@pytest.mark.parametrize('published', [True, False])
+def test_reconcile_publishes_moves(stand_in_models, published):
+    proxy = FakeGazeboProxy()
+    batch = _BatchPublisher(published)
+    manager = ModelManager(proxy, reconcile=True, batch_publisher=batch)
+    room = make_cube_room(obstacles=[(1.0, 1.0, 0.0), (-1.0, 1.0, 0.5)], model_manager=manager)
+    room.spawn_all()
+    ## nothing was live, so nothing to move
+    assert batch.calls == []
+
+    room.register_positions(room.target_tag, [[0.5, -1.0, 0.05]])
+    room.spawn_all()
+    names, positions, quaternions = batch.calls[0]
+    assert len(names) == 4 and manager._model_name('target', 0) in names
+    np.testing.assert_allclose(positions[names.index(manager._model_name('target', 0))], [0.5, -1.0, 0.05])
+    np.testing.assert_allclose(quaternions[names.index(manager._model_name('obstacle', 1))], [0, 0, np.sin(0.25), np.cos(0.25)])
+    ## a refused batch is sent as one set_model_state call per model
+    assert proxy.calls['set_model_state'] == (0 if published else 4)
+    manager.shutdown()
+
+def test_batch_publisher_needs_reconcile():
+    with pytest.raises(AssertionError):
+        ModelManager(FakeGazeboProxy(), batch_publisher=_BatchPublisher(True))
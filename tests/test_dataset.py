@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from roomor import generator
+from roomor.generator import CubeRoomConfig
+from roomor.dataset import save_rooms, RoomDataset
+
+from conftest import make_cube_room
+
+def test_round_trip(tmp_path):
+    rooms = [
+        make_cube_room(),
+        make_cube_room(half_side=3.0, obstacles=[(1.0, 0.0, 0.3), (-1.0, 1.0, 0.0)], targets=[(0.0, -2.0, 0.0)], max_obstacle_count=6)
+    ]
+    path = str(tmp_path / 'rooms.bin')
+    save_rooms(path, rooms)
+
+    dataset = RoomDataset(path)
+    assert len(dataset) == 2
+    for room, loaded in zip(rooms, dataset):
+        assert type(loaded) is type(room)
+        assert loaded.wall_polygon.equals(room.wall_polygon)
+        assert loaded.wall_thickness == room.wall_thickness
+        assert loaded.obstacle_size == room.obstacle_size
+        assert loaded.get_freespace_poly().equals(room.get_freespace_poly())
+        assert loaded.get_freezone_poly().equals(room.get_freezone_poly())
+        for tag in room.config_tags:
+            np.testing.assert_allclose(loaded.get_poses(tag), room.get_poses(tag))
+            ## spare rows for later register_positions calls survive the round trip
+            assert loaded.tag_slices[tag].stop - loaded.tag_slices[tag].start == room.tag_slices[tag].stop - room.tag_slices[tag].start
+
+def test_negative_index_and_bounds(tmp_path):
+    path = str(tmp_path / 'rooms.bin')
+    save_rooms(path, [make_cube_room(), make_cube_room(half_side=3.0)])
+    dataset = RoomDataset(path)
+    assert dataset[-1].wall_polygon.bounds == (-3.0, -3.0, 3.0, 3.0)
+    with pytest.raises(IndexError):
+        dataset[2]
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'not a dataset')
+    with pytest.raises(ValueError):
+        RoomDataset(str(path))
+
+class OuterWallRoomConfig(CubeRoomConfig):
+    ## a room class whose wall tag is not 'wall'
+    def __init__(self, *args, **kwargs):
+        super(OuterWallRoomConfig, self).__init__(*args, **kwargs)
+        self.wall_tag = 'outer_wall'
+        self.outer_wall_config_base = self.wall_config_base
+
+def test_wall_tag_from_room(tmp_path, monkeypatch):
+    monkeypatch.setattr(generator, 'OuterWallRoomConfig', OuterWallRoomConfig, raising=False)
+    room = make_cube_room(room_class=OuterWallRoomConfig)
+    path = str(tmp_path / 'rooms.bin')
+    save_rooms(path, [room, make_cube_room()])
+
+    dataset = RoomDataset(path)
+    assert not 'outer_wall_size' in dataset.columns and not 'wall_size' in dataset.columns
+    np.testing.assert_allclose(dataset.columns['obstacle_size'][0], room.obstacle_size)
+    loaded = dataset[0]
+    assert type(loaded) is OuterWallRoomConfig
+    np.testing.assert_allclose(loaded.get_poses('outer_wall'), room.get_poses('outer_wall'))
+    assert type(dataset[1]) is CubeRoomConfig
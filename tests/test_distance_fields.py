@@ -0,0 +1,57 @@
+import heapq
+import sys
+import numpy as np
+
+from roomor.geometric_util import euclidean_distance_transform, geodesic_distance, GRID_MOVES
+
+def _random_grid(seed, shape=(40,50), fill=0.25):
+    return np.random.RandomState(seed).uniform(size=shape) > fill
+
+def _dijkstra(free, sources):
+    h, w = free.shape
+    dist = np.full(free.shape, np.inf)
+    heap = [(0.0, y, x) for y, x in sources]
+    for _, y, x in heap:
+        dist[y, x] = 0
+    while heap:
+        d, y, x = heapq.heappop(heap)
+        if d > dist[y, x]:
+            continue
+        for dy, dx, cost in GRID_MOVES:
+            ny, nx = y+dy, x+dx
+            if not (0 <= ny < h and 0 <= nx < w and free[ny, nx]):
+                continue
+            if dy != 0 and dx != 0 and not (free[ny, x] and free[y, nx]):
+                continue
+            if d + cost < dist[ny, nx]:
+                dist[ny, nx] = d + cost
+                heapq.heappush(heap, (d + cost, ny, nx))
+    return dist
+
+def test_distance_transform_fallback_matches_scipy(monkeypatch):
+    grid = _random_grid(0)
+    expected = euclidean_distance_transform(grid, 0.05)
+    monkeypatch.setitem(sys.modules, 'scipy.ndimage', None)
+    np.testing.assert_allclose(euclidean_distance_transform(grid, 0.05), expected)
+    assert np.isinf(euclidean_distance_transform(np.ones([3,3], dtype=bool))).all()
+
+def test_geodesic_matches_dijkstra():
+    for seed in range(3):
+        grid = _random_grid(seed)
+        sources = [(y, x) for y, x in zip(*np.nonzero(grid))][::400]
+        np.testing.assert_allclose(geodesic_distance(grid, sources, 0.1), _dijkstra(grid, sources) * 0.1)
+
+def test_geodesic_ignores_outside_sources():
+    grid = np.ones([4,4], dtype=bool)
+    assert np.isinf(geodesic_distance(grid, [[-1, 0], [4, 4]])).all()
+
+def test_room_fields(cube_room):
+    ## freespace is the room's inside minus the obstacle at (1, 1); the target is at (-1, -1)
+    np.testing.assert_allclose(cube_room.get_obstacle_distances([[0.0, 0.0]]), [np.hypot(0.75, 0.75)], atol=0.05)
+    np.testing.assert_allclose(cube_room.get_target_distances([[-1.0, 0.0]]), [1.0], atol=0.05)
+    assert np.isinf(cube_room.get_target_distances([[10.0, 0.0]])).all()
+
+    distance_field = cube_room.get_distance_field()
+    cube_room.register_positions(cube_room.target_tag, [[1.0, -1.0, 0.05]])
+    assert cube_room.get_distance_field() is distance_field
+    np.testing.assert_allclose(cube_room.get_target_distances([[1.0, 0.0]]), [1.0], atol=0.05)
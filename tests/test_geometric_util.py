@@ -0,0 +1,58 @@
+import numpy as np
+
+from roomor.geometric_util import add_dimension, get_square_horizon, get_square_horizons, close_pairs, distance_filtered_mask
+
+## reference implementations: the loops these functions replaced
+
+def _square_horizon_loop(base_pos, radius, z_angle):
+    corners = [[radius, radius], [radius, -radius], [-radius, -radius], [-radius, radius]]
+    c, s = np.cos(z_angle), np.sin(z_angle)
+    return np.array([[c*x - s*y, s*x + c*y, 0] for x, y in corners]) + base_pos
+
+def _distance_filtered_loop(c, distance):
+    ban = np.zeros([len(c)], dtype=bool)
+    for i in range(len(c)):
+        if not ban[i]:
+            n = np.linalg.norm(c-c[i], axis=1) < distance
+            n[i] = False
+            ban = np.logical_or(ban, n)
+    return np.logical_not(ban)
+
+def test_add_dimension():
+    points = np.arange(6.0).reshape(3,2)
+    expected = np.concatenate([points, np.full([3,1], 7.0)], 1)
+    np.testing.assert_array_equal(add_dimension(points, 7.0), expected)
+    assert add_dimension(np.zeros([2,4,3])).shape == (2,4,4)
+
+def test_square_horizons_match_loop():
+    rng = np.random.RandomState(0)
+    base = rng.uniform(-5, 5, [20,3])
+    radius = rng.uniform(0.1, 2, 20)
+    angle = rng.uniform(-np.pi, np.pi, 20)
+    batched = get_square_horizons(base, radius, angle)
+    assert batched.shape == (20,4,3)
+    for i in range(20):
+        np.testing.assert_allclose(batched[i], _square_horizon_loop(base[i], radius[i], angle[i]), atol=1e-12)
+        np.testing.assert_allclose(get_square_horizon(base[i], radius[i], angle[i]), batched[i])
+
+def test_close_pairs_match_brute_force():
+    rng = np.random.RandomState(1)
+    points = rng.uniform(-1, 1, [300,3])
+    i, j = close_pairs(points, 0.1)
+    d = np.linalg.norm(points[:,np.newaxis] - points[np.newaxis], axis=2)
+    expected = set(zip(*np.nonzero(np.triu(d < 0.1, 1))))
+    assert set(zip(i.tolist(), j.tolist())) == expected
+    assert len(i) == len(expected)
+
+def test_distance_filtered_mask_matches_loop():
+    rng = np.random.RandomState(2)
+    for distance in (0.01, 0.05, 0.2):
+        coords = np.round(rng.uniform(-1, 1, [500,2]), 3)
+        ## duplicated vertices, as extruded mesh sections have
+        coords = np.concatenate([coords, coords[::7]])
+        rng.shuffle(coords)
+        np.testing.assert_array_equal(distance_filtered_mask(coords, distance), _distance_filtered_loop(coords, distance))
+
+def test_distance_filtered_mask_trivial():
+    assert distance_filtered_mask(np.zeros([1,2])).tolist() == [True]
+    assert distance_filtered_mask(np.zeros([3,2])).tolist() == [True, False, False]
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from roomor.grid_writer import OccupancyGridWriter, load_grid_dataset
+
+from conftest import make_cube_room
+
+def _items():
+    rooms = [make_cube_room(), make_cube_room(half_side=3.0, obstacles=[(0.0, 1.0, 0.5)])]
+    origins = [
+        [[0.0, 0.0, 0.0], [0.5, -0.5, 1.0], [-1.0, 0.0, 2.0]],
+        [[0.0, 0.0, 0.0], [1.0, 1.0, -1.0]]
+    ]
+    return list(zip(rooms, origins)) * 2
+
+def _interrupted(items, stop):
+    for i, item in enumerate(items):
+        if i == stop:
+            raise KeyboardInterrupt
+        yield item
+
+def test_write_and_load(tmp_path):
+    items = _items()
+    writer = OccupancyGridWriter(str(tmp_path), 16, resolution=0.1, map_size=32, chunk_size=4)
+    writer.write(items)
+    writer.close()
+
+    grids, index, meta = load_grid_dataset(str(tmp_path))
+    assert meta['count'] == len(grids) == 10
+    assert meta['items_done'] == 4
+    np.testing.assert_array_equal(index['item'], [0, 0, 0, 1, 1, 2, 2, 2, 3, 3])
+    room, origins = items[1]
+    np.testing.assert_array_equal(grids[3:5], room.get_cached_occupancy_grids(origins, 0.1, 32))
+
+def test_resume_matches_uninterrupted_run(tmp_path):
+    items = _items()
+    full = OccupancyGridWriter(str(tmp_path / 'full'), 16, resolution=0.1, map_size=32, chunk_size=4)
+    full.write(items)
+    full.close()
+
+    writer = OccupancyGridWriter(str(tmp_path / 'resumed'), 16, resolution=0.1, map_size=32, chunk_size=4)
+    with pytest.raises(KeyboardInterrupt):
+        writer.write(_interrupted(items, 3))
+    ## the second chunk was flushed on item 2's last sample, before item 2 was marked done, so the resume restarts at item 2
+    del writer
+    resumed = OccupancyGridWriter(str(tmp_path / 'resumed'), 16)
+    assert resumed.items_done == 2
+    resumed.write(items)
+    resumed.close()
+
+    a = load_grid_dataset(str(tmp_path / 'full'))
+    b = load_grid_dataset(str(tmp_path / 'resumed'))
+    np.testing.assert_array_equal(a[0], b[0])
+    np.testing.assert_array_equal(a[1], b[1])
+    assert a[2] == b[2]
+
+def test_capacity_exceeded(tmp_path):
+    writer = OccupancyGridWriter(str(tmp_path), 4, resolution=0.1, map_size=16)
+    with pytest.raises(ValueError):
+        writer.write(_items())
@@ -0,0 +1,80 @@
+import time
+import logging
+
+from roomor import instrumentation
+from roomor.instrumentation import Metrics, LoggingExporter, CallbackExporter
+from roomor.model_manager import ModelManager
+from roomor.fake_proxy import FakeGazeboProxy
+
+from conftest import make_cube_room
+
+def test_metrics_spans_and_counters():
+    metrics = Metrics()
+    for seconds in (0.01, 0.03):
+        with metrics.span('a'):
+            time.sleep(seconds)
+    metrics.count('spawned', 3)
+    metrics.count('spawned')
+    metrics.count('deleted', 0)
+
+    summary = metrics.summary()
+    a = summary['spans']['a']
+    assert a['count'] == 2
+    assert 0.04 <= a['total'] < 0.2 and 0.03 <= a['max'] < a['total']
+    assert a['mean'] == a['total'] / 2
+    ## zero counts are not recorded
+    assert summary['counters'] == dict(spawned=4)
+
+    metrics.reset()
+    assert metrics.summary() == dict(spans=dict(), counters=dict())
+
+def test_exporters_get_every_event(caplog):
+    events = list()
+    metrics = Metrics([CallbackExporter(lambda *event: events.append(event)), LoggingExporter(level=logging.INFO)])
+    with caplog.at_level(logging.INFO, logger='roomor'):
+        with metrics.span('a'):
+            pass
+        metrics.count('spawned', 2)
+    assert [e[:2] for e in events] == [('span', 'a'), ('count', 'spawned')]
+    assert events[1][2] == 2 and events[0][2] >= 0
+    assert [r.getMessage().split(' ')[0] for r in caplog.records] == ['a', 'spawned']
+    assert caplog.records[1].getMessage() == 'spawned += 2'
+
+def test_prometheus_text():
+    metrics = Metrics()
+    metrics.record('spawn_all', 0.5)
+    metrics.record('spawn_all', 0.25)
+    metrics.record('apply_model', 0.125)
+    metrics.count('models_spawned', 4)
+    assert metrics.prometheus_text() == (
+        '# TYPE roomor_span_seconds summary\n'
+        'roomor_span_seconds_sum{span="spawn_all"} 0.75\n'
+        'roomor_span_seconds_count{span="spawn_all"} 2\n'
+        'roomor_span_seconds_sum{span="apply_model"} 0.125\n'
+        'roomor_span_seconds_count{span="apply_model"} 1\n'
+        '# TYPE roomor_span_seconds_max gauge\n'
+        'roomor_span_seconds_max{span="spawn_all"} 0.5\n'
+        'roomor_span_seconds_max{span="apply_model"} 0.125\n'
+        '# TYPE roomor_models_spawned_total counter\n'
+        'roomor_models_spawned_total 4\n'
+    )
+    assert Metrics().prometheus_text(prefix='x') == '\n'
+
+def test_set_instrumentation(stand_in_models):
+    metrics = Metrics()
+    previous = instrumentation.set_instrumentation(metrics)
+    try:
+        assert instrumentation.get_instrumentation() is metrics
+        manager = ModelManager(FakeGazeboProxy())
+        make_cube_room(obstacles=[(1.0, 1.0, 0.0), (-1.0, 1.0, 0.5)], model_manager=manager).spawn_all()
+        manager.shutdown()
+    finally:
+        assert instrumentation.set_instrumentation(previous) is metrics
+    summary = metrics.summary()
+    assert summary['counters']['models_spawned'] == 4
+    assert summary['spans']['spawn_all']['count'] == 1
+    ## without reconcile each of wall, obstacle and target is applied on its own
+    assert summary['spans']['apply_model.spawn']['count'] == 3
+    ## the no-op default records nothing
+    instrumentation.count('models_spawned')
+    assert metrics.summary()['counters']['models_spawned'] == 4
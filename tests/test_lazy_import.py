@@ -0,0 +1,38 @@
+import os
+import sys
+import json
+import subprocess
+
+from roomor.benchmark import HEAVY_MODULES
+
+## every roomor module that a user may import before deciding to talk to gazebo
+MODULES = (
+    'roomor', 'roomor.generator', 'roomor.dataset', 'roomor.grid_writer', 'roomor.world_scheduler',
+    'roomor.world_export', 'roomor.batch_publisher', 'roomor.fake_proxy', 'roomor.benchmark', 'roomor.lidar',
+    'roomor.spatial_index'
+)
+
+## a finder ahead of the real ones records every attempt to import a heavy module, so the test also holds
+## where pcg_gazebo or rospy are not installed
+CODE = '''
+import sys, json
+heavy = set({heavy!r})
+attempted = list()
+class Finder(object):
+    def find_spec(self, name, path=None, target=None):
+        if name.split('.')[0] in heavy:
+            attempted.append(name)
+        return None
+sys.meta_path.insert(0, Finder())
+import {modules}
+print(json.dumps(dict(attempted=attempted, loaded=[m for m in heavy if m in sys.modules])))
+'''
+
+def test_import_loads_no_heavy_module():
+    heavy = HEAVY_MODULES + ('rospy', 'gazebo_msgs', 'geometry_msgs')
+    out = subprocess.check_output(
+        [sys.executable, '-c', CODE.format(heavy=heavy, modules=', '.join(MODULES))],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    result = json.loads(out.decode().splitlines()[-1])
+    assert result == dict(attempted=[], loaded=[])
@@ -0,0 +1,59 @@
+import numpy as np
+
+from roomor.lidar import LidarSimulator, polygon_segments
+
+def _room_segments():
+    from shapely.geometry import box
+    return polygon_segments([box(-2, -2, 2, 2)])
+
+def test_ranges_in_square_room():
+    lidar = LidarSimulator(_room_segments(), beams=4)
+    np.testing.assert_allclose(lidar.angles, [-np.pi, -np.pi/2, 0, np.pi/2])
+    ranges = lidar.scan([[0.5, 0.0, 0.0], [0.0, 0.0, np.pi/2]])
+    np.testing.assert_allclose(ranges, [[2.5, 2.0, 1.5, 2.0], [2.0, 2.0, 2.0, 2.0]])
+
+def test_matches_shapely_ray_casts():
+    from shapely.geometry import box, LineString, Point
+    room = box(-2, -2, 2, 2)
+    obstacle = box(0.5, 0.5, 1.0, 1.2).buffer(0)
+    lidar = LidarSimulator(polygon_segments([room, obstacle]), beams=36, range_max=10.0)
+    pose = np.array([-0.3, 0.2, 0.4])
+    ranges = lidar.scan([pose])[0]
+    origin = Point(pose[:2])
+    for angle, r in zip(pose[2] + lidar.angles, ranges):
+        ray = LineString([pose[:2], pose[:2] + 10*np.array([np.cos(angle), np.sin(angle)])])
+        hits = ray.intersection(room.boundary.union(obstacle.boundary))
+        np.testing.assert_allclose(r, origin.distance(hits), atol=1e-9)
+
+def test_surface_below_range_min_blocks_beam():
+    ## a surface 0.1 m ahead with range_min 0.3 reads no_hit, not the wall behind it
+    segments = np.concatenate([_room_segments(), [[0.1, -0.5, 0.1, 0.5]]])
+    lidar = LidarSimulator(segments, beams=4, range_min=0.3, no_hit=-1.0)
+    ranges = lidar.scan([[0.0, 0.0, 0.0]])[0]
+    np.testing.assert_allclose(ranges, [2.0, 2.0, -1.0, 2.0])
+
+def test_range_max_and_no_hit():
+    lidar = LidarSimulator(_room_segments(), beams=4, range_max=1.8, no_hit=np.nan)
+    ranges = lidar.scan([[0.5, 0.0, 0.0]])[0]
+    assert np.isnan(ranges[[0, 1, 3]]).all()
+    np.testing.assert_allclose(ranges[2], 1.5)
+    assert np.isinf(LidarSimulator(np.zeros([0,4]), beams=4).scan([[0, 0, 0]])).all()
+
+def test_chunking_and_noise():
+    poses = np.random.RandomState(0).uniform(-1.5, 1.5, [50,3])
+    lidar = LidarSimulator(_room_segments(), beams=90)
+    small = LidarSimulator(_room_segments(), beams=90, chunk_elements=1)
+    np.testing.assert_array_equal(lidar.scan(poses), small.scan(poses))
+
+    noisy = LidarSimulator(_room_segments(), beams=90, noise_std=0.01)
+    a = noisy.scan(poses, np.random.RandomState(1))
+    b = noisy.scan(poses, np.random.RandomState(1))
+    np.testing.assert_array_equal(a, b)
+    assert 0 < np.abs(a - lidar.scan(poses)).max() < 0.1
+
+def test_from_room(cube_room):
+    lidar = LidarSimulator.from_room(cube_room, beams=4)
+    ## the obstacle at (1, 1) of half side 0.25 faces the robot at (1, 0) from 0.75 m; the wall is 1.95 m away inside
+    np.testing.assert_allclose(lidar.scan([[1.0, 0.0, 0.0]])[0], [2.95, 1.95, 0.95, 0.75], atol=1e-9)
+    with_targets = LidarSimulator.from_room(cube_room, extra_tags=('target',), beams=4)
+    np.testing.assert_allclose(with_targets.scan([[-1.0, 0.0, 0.0]])[0][1], 0.9, atol=1e-9)
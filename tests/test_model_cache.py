@@ -0,0 +1,84 @@
+import numpy as np
+
+from roomor.model_cache import LRUCache, ModelTemplateRegistry, config_digest, clone_model, rename_model
+
+class _Element(object):
+    def __init__(self):
+        self.geometry = np.zeros(1000)
+
+class _Link(object):
+    def __init__(self, name):
+        self.name = name
+        self.collisions = [_Element()]
+        self.visuals = [_Element()]
+
+class _Model(object):
+    ## the attributes of a pcg SimulationModel that clone_model and rename_model use
+    def __init__(self, name):
+        self.name = name
+        self.links = dict([(name, _Link(name))])
+        self.pose = [0.0, 0.0, 0.0]
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert 'a' in cache and 'c' in cache
+    assert not 'b' in cache
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_lru_maxbytes_keeps_newest():
+    cache = LRUCache(maxsize=8, maxbytes=1000)
+    cache.put(0, np.zeros(100)) ## 800 bytes
+    cache.put(1, np.zeros(100))
+    assert list(cache._items.keys()) == [1]
+    assert cache.nbytes == 800
+    ## a single value over maxbytes is still kept
+    cache.put(2, np.zeros(1000))
+    assert len(cache) == 1 and cache.nbytes == 8000
+
+def test_lru_replace_updates_nbytes():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', np.zeros(10))
+    cache.put('a', np.zeros(20))
+    assert len(cache) == 1 and cache.nbytes == 160
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0 and cache.hit_rate == 0.0
+
+def test_config_digest_ignores_name():
+    a = dict(type='box', args=dict(size=[1, 1, 1], name='obstacle'))
+    b = dict(type='box', args=dict(size=[1, 1, 1], name='other'))
+    c = dict(type='box', args=dict(size=[1, 1, 2], name='obstacle'))
+    assert config_digest(a) == config_digest(b)
+    assert config_digest(a) != config_digest(c)
+
+def test_clone_model_shares_geometry():
+    model = _Model('wall')
+    clone = clone_model(model)
+    clone.pose[0] = 1.0
+    assert model.pose[0] == 0.0
+    assert clone.links['wall'] is not model.links['wall']
+    assert clone.links['wall'].collisions[0].geometry is model.links['wall'].collisions[0].geometry
+    assert clone.links['wall'].visuals[0].geometry is model.links['wall'].visuals[0].geometry
+
+def test_rename_model_renames_model_link():
+    model = rename_model(clone_model(_Model('wall')), 'mm-0-wall_0')
+    assert model.name == 'mm-0-wall_0'
+    assert list(model.links.keys()) == ['mm-0-wall_0']
+    assert model.links['mm-0-wall_0'].name == 'mm-0-wall_0'
+
+def test_registry_builds_each_config_once():
+    registry = ModelTemplateRegistry()
+    built = list()
+    def build(config):
+        built.append(config)
+        return _Model(config['args']['name'])
+    config = dict(type='box', args=dict(size=[1, 1, 1], name='obstacle'))
+    models = registry.instantiate(config, ['a', 'b'], build)
+    registry.instantiate(dict(config, args=dict(config['args'], name='x')), ['c'], build)
+    assert len(built) == 1
+    assert [m.name for m in models] == ['a', 'b']
+    assert models[0].links['a'].collisions[0].geometry is models[1].links['b'].collisions[0].geometry
@@ -0,0 +1,214 @@
+import asyncio
+import numpy as np
+import pytest
+from concurrent.futures import TimeoutError
+
+from roomor.model_manager import ModelManager
+from roomor.fake_proxy import FakeGazeboProxy
+
+from conftest import make_cube_room, StandInModel
+
+def _deletes(n):
+    return [dict(model_name='m{}'.format(i)) for i in range(n)]
+
+def test_call_timeout_is_per_call():
+    ## 8 calls of 0.05 sec on 2 workers take 0.2 sec in all, but none runs longer than call_timeout
+    proxy = FakeGazeboProxy(latency=0.05)
+    manager = ModelManager(proxy, max_workers=2, call_timeout=0.15)
+    results = manager._gather(manager._submit(proxy.delete_model, _deletes(8)))
+    assert results == [False] * 8
+    assert proxy.calls['delete_model'] == 8
+    manager.shutdown()
+
+def test_call_timeout_raises():
+    proxy = FakeGazeboProxy(latency=dict(delete_model=0.5))
+    manager = ModelManager(proxy, max_workers=2, call_timeout=0.1)
+    with pytest.raises(TimeoutError):
+        manager._gather(manager._submit(proxy.delete_model, _deletes(1)))
+    manager.shutdown()
+
+def test_async_call_timeout():
+    proxy = FakeGazeboProxy(latency=0.05, serialize=True)
+    manager = ModelManager(proxy, max_workers=2, call_timeout=0.15)
+
+    async def run(n):
+        return await manager._agather(asyncio.Semaphore(2), proxy.delete_model, _deletes(n))
+    assert asyncio.run(run(8)) == [False] * 8
+
+    proxy.latency = 0.5
+    with pytest.raises(TimeoutError):
+        asyncio.run(run(1))
+    manager.shutdown()
+
+def test_reconcile_moves_live_models():
+    ## every pose has a live model, so apply_models only moves them and deletes the extra and foreign ones
+    proxy = FakeGazeboProxy()
+    manager = ModelManager(proxy, reconcile=True)
+    other = ModelManager(proxy)
+    manager.modelspaces['obstacle'] = [None] * 3
+    for name in [manager._model_name('obstacle', i) for i in range(3)] + [other._model_name('obstacle', 0)]:
+        proxy.models[name] = (None, [0, 0, 0], [0, 0, 0])
+
+    manager.apply_models([('obstacle', [[1, 0, 0], [2, 0, 0]], [[0, 0, 0], [0, 0, 1]])])
+    assert sorted(proxy.models.keys()) == [manager._model_name('obstacle', i) for i in range(2)]
+    pos, rot = proxy.models[manager._model_name('obstacle', 1)][1:]
+    assert pos == [2.0, 0.0, 0.0]
+    np.testing.assert_allclose(rot, [0, 0, np.sin(0.5), np.cos(0.5)])
+    assert proxy.calls['set_model_state'] == 2
+    assert proxy.calls['delete_model'] == 2
+    assert proxy.calls['spawn_sdf_model'] == 0
+    manager.shutdown()
+
+def test_spawn_all_spawns_through_proxy(stand_in_models):
+    proxy = FakeGazeboProxy()
+    manager = ModelManager(proxy)
+    room = make_cube_room(obstacles=[(1.0, 1.0, 0.0), (-1.0, 1.0, 0.5)], model_manager=manager)
+    room.spawn_all()
+    ## wall, 2 obstacles and a target
+    assert proxy.calls['spawn_sdf_model'] == 4
+    assert sorted(proxy.models.keys()) == sorted(
+        [manager._model_name('wall', 0), manager._model_name('target', 0)] + [manager._model_name('obstacle', i) for i in range(2)]
+    )
+    xml, pos, rot = proxy.models[manager._model_name('obstacle', 1)]
+    assert xml == '<sdf version="1.6"><model name="{}"/></sdf>'.format(manager._model_name('obstacle', 1))
+    assert pos == [-1.0, 1.0, 0.4] and rot == [0.0, 0.0, 0.5]
+    assert all(type(v) is float for v in pos + rot)
+    assert not manager.modelspaces['target'][0].get_link_by_name('link').collision_enabled
+
+    ## a respawn replaces the live models and drops the extra obstacle; slots never spawned are not deleted
+    room.register_positions(room.obstacle_tag, [[0.0, 1.0, 0.4]])
+    room.spawn_all()
+    assert proxy.calls['spawn_sdf_model'] == 7
+    assert proxy.calls['delete_model'] == 4
+    assert len(proxy.models) == 3
+    manager.shutdown()
+
+class _Message(object):
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+def _set_model_state_request():
+    point = _Message(x=0.0, y=0.0, z=0.0)
+    quaternion = _Message(x=0.0, y=0.0, z=0.0, w=1.0)
+    return _Message(model_state=_Message(model_name='', pose=_Message(position=point, orientation=quaternion), reference_frame=''))
+
+class _Service(object):
+    def __init__(self, response):
+        self.request_class = _set_model_state_request
+        self.requests = list()
+        self.response = response
+
+    def __call__(self, request):
+        self.requests.append(request)
+        return self.response
+
+class _GazeboProxyStub(object):
+    ## the parts of pcg_gazebo's GazeboProxy that reconcile touches: its methods plus the rospy services in _services.
+    ## move_model fails as GazeboProxy's does on python 3.10+
+    def __init__(self, model_names):
+        self.model_names = list(model_names)
+        self.deleted = list()
+        self._services = dict(set_model_state=_Service(_Message(success=True)))
+
+    def get_model_names(self):
+        return list(self.model_names)
+
+    def delete_model(self, model_name):
+        self.deleted.append(model_name)
+        return True
+
+    def move_model(self, model_name, pos, rot=[0, 0, 0], reference_frame='world'):
+        raise AttributeError("module 'collections' has no attribute 'Iterable'")
+
+def test_reconcile_moves_through_set_model_state():
+    manager = ModelManager(_GazeboProxyStub([]), reconcile=True)
+    proxy = manager.gazebo_proxy
+    proxy.model_names.append(manager._model_name('target', 0))
+    manager.modelspaces['target'] = [None]
+
+    assert manager.apply_models([('target', [[1, 2, 0.05]], [[0, 0, np.pi/2]])]) == [True]
+    assert proxy.deleted == []
+    request, = proxy._services['set_model_state'].requests
+    state = request.model_state
+    assert (state.model_name, state.reference_frame) == (manager._model_name('target', 0), 'world')
+    assert (state.pose.position.x, state.pose.position.y, state.pose.position.z) == (1.0, 2.0, 0.05)
+    np.testing.assert_allclose([state.pose.orientation.x, state.pose.orientation.y, state.pose.orientation.z, state.pose.orientation.w],
+                               [0, 0, np.sqrt(0.5), np.sqrt(0.5)])
+    manager.shutdown()
+
+@pytest.fixture
+def merged_builds(stand_in_models, monkeypatch):
+    ## merged models are StandInModels; the list holds the tag_poses of every build
+    builds = list()
+    def build(self, tag, tag_poses):
+        builds.append(tag_poses)
+        return StandInModel(self._model_name(tag, 0))
+    monkeypatch.setattr(ModelManager, '_build_merged', build)
+    return builds
+
+@pytest.mark.parametrize('reconcile', [False, True])
+def test_merged_spawn_skips_unchanged_merge(merged_builds, reconcile):
+    proxy = FakeGazeboProxy()
+    manager = ModelManager(proxy, reconcile=reconcile)
+    room = make_cube_room(obstacles=[(1.0, 1.0, 0.0), (-1.0, 1.0, 0.5)], model_manager=manager)
+    room.merge_tags.append(room.obstacle_tag)
+    room.spawn_all()
+    ## wall, target and the merged obstacles; obstacle slots were never spawned, so none is deleted
+    assert len(merged_builds) == 1
+    assert sorted(proxy.models.keys()) == sorted(
+        [manager._model_name(t, 0) for t in ('wall', 'target', room.merged_tag)]
+    )
+    assert proxy.calls['delete_model'] == 0
+
+    room.spawn_all()
+    assert len(merged_builds) == 1
+    if reconcile:
+        assert (proxy.calls['spawn_sdf_model'], proxy.calls['delete_model']) == (3, 0)
+    else:
+        ## the respawn deletes only the 3 live models
+        assert (proxy.calls['spawn_sdf_model'], proxy.calls['delete_model']) == (6, 3)
+
+    room.register_positions(room.obstacle_tag, [[0.0, 1.0, 0.4]])
+    room.spawn_all()
+    assert len(merged_builds) == 2
+    assert manager._model_name(room.merged_tag, 0) in proxy.models
+    assert len(proxy.models) == 3
+    manager.shutdown()
+
+def test_merge_deletes_models_spawned_on_their_own(merged_builds):
+    proxy = FakeGazeboProxy()
+    manager = ModelManager(proxy, reconcile=True)
+    room = make_cube_room(obstacles=[(1.0, 1.0, 0.0), (-1.0, 1.0, 0.5)], model_manager=manager)
+    room.spawn_all()
+    assert manager.is_spawned(room.obstacle_tag)
+
+    room.merge_tags.append(room.obstacle_tag)
+    room.spawn_all()
+    assert not manager.is_spawned(room.obstacle_tag)
+    assert proxy.calls['delete_model'] == 2
+    assert sorted(proxy.models.keys()) == sorted(
+        [manager._model_name(t, 0) for t in ('wall', 'target', room.merged_tag)]
+    )
+    ## the obstacle slots are empty now, so the next spawn leaves them alone
+    room.spawn_all()
+    assert proxy.calls['delete_model'] == 2
+    manager.shutdown()
+
+def test_set_modelspace_from_models_leaves_cache_alone(stand_in_models):
+    manager = ModelManager(FakeGazeboProxy())
+    config = [dict(type='box', args=dict(size=[1, 1, 1], name='obstacle'))]
+    manager.set_modelspace_from_config('obstacle', config, 3, cache_key='box')
+    cached = manager.modelspaces['obstacle']
+    cached_models = list(cached)
+
+    replacement = StandInModel('mine')
+    manager.set_modelspace_from_models('obstacle', [replacement])
+    assert manager.modelspaces['obstacle'][0].name == manager._model_name('obstacle', 0)
+    assert manager.modelspaces['obstacle'][1:] == cached_models[1:]
+    ## neither the cached list and models nor the given model changed
+    assert cached == cached_models and replacement.name == 'mine'
+    assert [m.name for m in cached] == [manager._model_name('obstacle', i) for i in range(3)]
+
+    ## another room with the same config gets the cached modelspace back
+    manager.set_modelspace_from_config('obstacle', config, 3, cache_key='box')
+    assert manager.modelspaces['obstacle'] == cached_models
@@ -0,0 +1,78 @@
+import os
+import time
+import threading
+import pytest
+from concurrent.futures import TimeoutError
+
+from roomor.prefetch import RoomPrefetcher
+
+## jobs run in forked producers, so each producer counts from the parent's _produced
+_produced = 0
+
+def _count(step):
+    global _produced
+    _produced += step
+    return os.getpid(), _produced
+
+def _slow():
+    time.sleep(10)
+
+class _Unpicklable(Exception):
+    def __init__(self, a, b):
+        super(_Unpicklable, self).__init__(a)
+        self.lock = threading.Lock()
+
+def _fail(unpicklable):
+    if unpicklable:
+        raise _Unpicklable('boom', 1)
+    raise ValueError('boom')
+
+def test_items_of_a_producer_keep_their_order():
+    prefetcher = RoomPrefetcher(_count, (1,), queue_size=4, producers=2)
+    prefetcher.start()
+    items = [prefetcher.get(timeout=5) for _ in range(20)]
+    prefetcher.stop()
+    for pid in set(p for p, _ in items):
+        counts = [n for p, n in items if p == pid]
+        assert counts == list(range(1, len(counts) + 1))
+    metrics = prefetcher.metrics()
+    assert metrics['consumed'] == 20 and metrics['produced'] >= 20
+
+def test_stop_ends_blocked_producers():
+    ## the producers fill the queue and then block on put until stop
+    prefetcher = RoomPrefetcher(_count, (1,), queue_size=2, producers=2)
+    prefetcher.start()
+    time.sleep(0.3)
+    processes = prefetcher.processes
+    start = time.time()
+    prefetcher.stop()
+    assert time.time() - start < 1.0
+    assert prefetcher.processes == [] and not any(p.is_alive() for p in processes)
+
+def test_get_timeout_and_cancel():
+    prefetcher = RoomPrefetcher(_slow, (), producers=1)
+    prefetcher.start()
+    with pytest.raises(TimeoutError):
+        prefetcher.get(timeout=0.1)
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    start = time.time()
+    with pytest.raises(TimeoutError):
+        prefetcher.get(cancel=cancel)
+    assert time.time() - start < 1.0
+    prefetcher.stop(timeout=0.1)
+    assert prefetcher.metrics()['consumer_starved'] == 2
+
+@pytest.mark.parametrize('unpicklable', [False, True])
+def test_producer_exception_is_raised_by_get(unpicklable):
+    prefetcher = RoomPrefetcher(_fail, (unpicklable,), producers=1)
+    prefetcher.start()
+    with pytest.raises(RuntimeError if unpicklable else ValueError) as info:
+        prefetcher.get(timeout=5)
+    assert 'boom' in str(info.value)
+    assert 'in _fail' in str(info.value.__cause__)
+    ## the producer stopped after the failure
+    prefetcher.processes[0].join(5)
+    assert not prefetcher.processes[0].is_alive()
+    prefetcher.stop()
+    assert prefetcher.metrics()['consumed'] == 0
@@ -0,0 +1,93 @@
+import numpy as np
+
+from conftest import make_cube_room
+
+def test_pose_buffer_views(cube_room):
+    room = cube_room
+    obstacles = room.get_poses(room.obstacle_tag)
+    assert np.shares_memory(obstacles, room.pose_buffer)
+    np.testing.assert_allclose(room.get_pose_array(), np.concatenate([room.get_poses(t) for t in room.config_tags]))
+
+    ## growing past the reserved capacity re-packs the buffer and keeps the other tags' poses
+    targets = room.get_poses(room.target_tag).copy()
+    positions = np.arange(18.0).reshape(6,3)
+    room.register_positions(room.obstacle_tag, positions)
+    room.register_orientations(room.obstacle_tag, np.zeros([6,3]))
+    np.testing.assert_allclose(room.get_poses(room.obstacle_tag)[:,:3], positions)
+    np.testing.assert_allclose(room.obstacle_pose['positions'], positions)
+    np.testing.assert_allclose(room.get_poses(room.target_tag), targets)
+
+    ## shrinking keeps the capacity for the next room
+    room.register_positions(room.obstacle_tag, positions[:2])
+    assert len(room.get_poses(room.obstacle_tag)) == 2
+    s = room.tag_slices[room.obstacle_tag]
+    assert s.stop - s.start == 6
+
+def test_quaternion_orientations(cube_room):
+    room = cube_room
+    room.register_orientations(room.obstacle_tag, [[0, 0, np.sin(0.25), np.cos(0.25)]])
+    np.testing.assert_allclose(room.get_poses(room.obstacle_tag)[0,3:], [0, 0, 0.5], atol=1e-12)
+
+def test_cached_grids_match_direct_rendering(cube_room):
+    room = cube_room
+    origins = [[0.0, 0.0, 0.0], [0.5, -0.3, 0.7]]
+    base = room.occupancy_base_resolution
+    direct = room.get_occupancy_grids(room.get_freespace_poly(), origins, base, 64)
+    np.testing.assert_array_equal(room.get_cached_occupancy_grids(origins, base, 64), direct)
+
+    ## coarser grids come from a downsampled level and differ only along edges
+    coarse = room.get_cached_occupancy_grids(origins, 4*base, 64)
+    direct = room.get_occupancy_grids(room.get_freespace_poly(), origins, 4*base, 64)
+    assert (coarse == direct).mean() > 0.97
+    ## level 2 is downsampled straight from level 0
+    assert sorted(room.occupancy_cache._items.keys()) == [0, 2]
+
+def test_occupancy_cache_invalidated_by_obstacles(cube_room):
+    room = cube_room
+    room.get_cached_occupancy_grid()
+    room.get_distance_field()
+    cached = len(room.occupancy_cache)
+    room.register_positions(room.target_tag, [[0.0, 0.0, 0.05]])
+    assert len(room.occupancy_cache) == cached > 0 and len(room.distance_fields) == 1
+    room.register_positions(room.obstacle_tag, [[0.0, 0.0, 0.4]])
+    assert len(room.occupancy_cache) == 0 and len(room.distance_fields) == 0
+
+class _RandoorOccupancy(object):
+    ## randoor's get_occupancy_grid: the freespace moved into the origin frame, tested at every cell center
+    def get_occupancy_grid(self, space_poly, origin_pos=(0,0), origin_ori=0, resolution=0.05, map_size=512, pass_color=255, obs_color=0):
+        from shapely import affinity
+        from shapely.geometry import Point
+        from shapely.prepared import prep
+        moved = affinity.rotate(affinity.translate(space_poly, -origin_pos[0], -origin_pos[1]), -origin_ori, origin=(0, 0), use_radians=True)
+        contains = prep(moved).contains
+        lin = np.linspace(-(map_size * resolution) / 2, (map_size * resolution) / 2, map_size)
+        xx, yy = np.meshgrid(lin, lin)
+        data = np.full([map_size*map_size], obs_color, dtype=np.uint8)
+        data[[contains(Point(x, y)) for x, y in zip(xx.ravel(), yy.ravel())]] = pass_color
+        return data
+
+def test_batched_grids_match_per_room_grids():
+    from shapely.geometry import Point
+    rooms = [
+        make_cube_room(),
+        make_cube_room(half_side=1.5, obstacles=[(0.5, 0.0, 0.3), (-0.6, 0.6, 1.2)]),
+        make_cube_room(half_side=2.5, obstacles=[(1.0, -1.0, 0.0), (-1.0, 1.0, 0.8), (0.0, 0.0, 2.0)])
+    ]
+    origins = np.array([[0.0, 0.0, 0.0], [0.4, -0.3, 0.7], [-1.0, 0.5, -2.0]])
+    resolution = 0.1
+    for room in rooms:
+        freespace = room.get_freespace_poly()
+        batched = room.get_occupancy_grids(freespace, origins, resolution, 64)
+        room.randoor_config = _RandoorOccupancy()
+        for origin, grid in zip(origins, batched):
+            per_room = room.get_occupancy_grid(freespace, origin[:2], origin[2], resolution, 64)
+            assert grid.ravel().shape == per_room.shape and grid.dtype == per_room.dtype
+            ## the batch samples a raster of resolution, so cells may only differ within a cell of an edge
+            lin = np.linspace(-3.2, 3.2, 64)
+            c, s = np.cos(origin[2]), np.sin(origin[2])
+            differ = np.flatnonzero(grid.ravel() != per_room)
+            assert len(differ) < 0.03 * per_room.size
+            for i in differ:
+                x, y = lin[i % 64], lin[i // 64]
+                point = Point(c*x - s*y + origin[0], s*x + c*y + origin[1])
+                assert freespace.boundary.distance(point) <= resolution
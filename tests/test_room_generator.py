@@ -0,0 +1,81 @@
+import random
+import numpy as np
+import pytest
+
+from roomor.room_generator_factory import RoomGeneratorFactory, generate_components
+from roomor.fake_proxy import FakeGazeboProxy
+
+class _RandoorConfig(object):
+    tag_wall = 'wall'
+    tag_obstacle = 'obstacle'
+
+    def __init__(self, positions):
+        self.positions = positions
+
+    def get_polygons(self, tag):
+        from shapely.geometry import box
+        return [box(-2, -2, 2, 2)]
+
+    def get_positions(self, tag):
+        return self.positions
+
+class _RandoorGenerator(object):
+    ## draws from both global random states, like randoor
+    def generate_new(self):
+        return _RandoorConfig([[np.random.uniform(-1, 1), random.uniform(-1, 1), np.random.random()] for _ in range(3)])
+
+def test_seeded_components_repeat():
+    a = generate_components(_RandoorGenerator(), 0.05, [('obstacle', 'tag_obstacle', 0.4)], seed=7)
+    np.random.random()
+    random.random()
+    b = generate_components(_RandoorGenerator(), 0.05, [('obstacle', 'tag_obstacle', 0.4)], seed=7)
+    c = generate_components(_RandoorGenerator(), 0.05, [('obstacle', 'tag_obstacle', 0.4)], seed=8)
+    np.testing.assert_array_equal(a['xyy']['obstacle'], b['xyy']['obstacle'])
+    assert not np.array_equal(a['xyy']['obstacle'], c['xyy']['obstacle'])
+
+def test_seeding_restores_global_state():
+    np.random.seed(0)
+    random.seed(0)
+    expected = (np.random.random(), random.random())
+    np.random.seed(0)
+    random.seed(0)
+    generate_components(_RandoorGenerator(), 0.05, [('obstacle', 'tag_obstacle', 0.4)], seed=7)
+    assert (np.random.random(), random.random()) == expected
+
+def test_randoor_rooms_repeat():
+    ## without the memo: randoor itself, trimesh's polygon sampler included, has to repeat the room
+    pytest.importorskip('randoor')
+    from randoor.generator import SimpleSearchRoomGenerator
+    pose_tags = [('obstacle', 'tag_obstacle', 0.35), ('target', 'tag_target', 0.1)]
+    generator = SimpleSearchRoomGenerator(obstacle_count=10)
+    a = generate_components(generator, 0.05, pose_tags, seed=11)
+    b = generate_components(generator, 0.05, pose_tags, seed=11)
+    for name, _, _ in pose_tags:
+        np.testing.assert_array_equal(a['xyy'][name], b['xyy'][name])
+
+class _Factory(RoomGeneratorFactory):
+    ## rooms are the poses generate_batch hands to _build_room
+    def __init__(self, **kwargs):
+        super(_Factory, self).__init__(gazebo_proxy=FakeGazeboProxy(), **kwargs)
+        self.randoor_generator = _RandoorGenerator()
+        self.room_wall_thickness = 0.05
+        self.pose_tags = [('obstacle', 'tag_obstacle', 0.4)]
+
+    def _build_room(self, components, poses, build_models=True):
+        return poses
+
+def test_generate_batch_memoize():
+    factory = _Factory()
+    batch = factory.generate_batch(3, seed=5, memoize=False)
+    assert len(factory.room_memo.memory) == 0
+    assert batch.poses['obstacle'].shape == (3, 3, 6)
+
+    memoized = factory.generate_batch(3, seed=5)
+    assert len(factory.room_memo.memory) == 3
+    np.testing.assert_array_equal(batch.poses['obstacle'], memoized.poses['obstacle'])
+    ## memoize=False does not read the memo either
+    hits = factory.room_memo.memory.hits
+    factory.generate_batch(3, seed=5, memoize=False)
+    assert factory.room_memo.memory.hits == hits
+    factory.generate_batch(3, seed=5)
+    assert factory.room_memo.memory.hits == hits + 3
@@ -0,0 +1,33 @@
+import os
+
+from roomor.room_memo import RoomMemo
+
+def test_get_returns_fresh_copies():
+    memo = RoomMemo(maxsize=2)
+    components = dict(wall=[[0, 0], [1, 0], [1, 1]], obstacle=[[0.5, 0.5, 0.0]])
+    memo.put(('digest', 1), components)
+    a = memo.get(('digest', 1))
+    assert a == components
+    a['obstacle'].append([1, 1, 1])
+    assert memo.get(('digest', 1)) == components
+    assert memo.get(('digest', 2)) is None
+
+def test_lru_and_disabled():
+    memo = RoomMemo(maxsize=1)
+    memo.put(('d', 1), 1)
+    memo.put(('d', 2), 2)
+    assert memo.get(('d', 1)) is None and memo.get(('d', 2)) == 2
+
+    disabled = RoomMemo(maxsize=0)
+    assert not disabled.enabled
+    disabled.put(('d', 1), 1)
+    assert disabled.get(('d', 1)) is None
+
+def test_directory_shared_between_memos(tmp_path):
+    directory = str(tmp_path / 'memo')
+    RoomMemo(maxsize=0, directory=directory).put(('d', 3), [1, 2, 3])
+    assert os.listdir(directory) == ['d-3.pkl']
+    reader = RoomMemo(maxsize=4, directory=directory)
+    assert reader.get(('d', 3)) == [1, 2, 3]
+    ## loaded into the in-memory cache on first read
+    assert reader.info()['size'] == 1
@@ -0,0 +1,49 @@
+import numpy as np
+
+from roomor.spatial_index import RoomSpatialIndex
+from roomor.geometric_util import wall_footprint
+
+from conftest import make_cube_room
+
+def test_queries_match_shapely(cube_room):
+    from shapely.geometry import Point
+    index = cube_room.get_spatial_index()
+    footprints = cube_room.get_obstacle_footprints()
+    points = np.random.RandomState(0).uniform(-2.5, 2.5, [200,2])
+
+    contains = index.contains(points)
+    distance = index.distance_to_nearest_obstacle(points)
+    for k, p in enumerate(points):
+        q = Point(p)
+        assert contains[k] == cube_room.get_freespace_poly().contains(q)
+        np.testing.assert_allclose(distance[k], min(f.distance(q) for f in footprints), atol=1e-9)
+
+    free = index.is_free(points, 0.2)
+    np.testing.assert_array_equal(free, contains & (distance >= 0.2))
+
+def test_wall_footprint_covers_full_thickness():
+    from shapely.geometry import box
+    footprint = wall_footprint(box(-1, -1, 1, 1), 0.1)
+    assert footprint.contains(box(-1.09, -1.09, -0.91, 0.9))
+    np.testing.assert_allclose(footprint.area, 2.2**2 - 1.8**2)
+
+def test_sample_free_poses(cube_room):
+    index = cube_room.get_spatial_index()
+    poses = index.sample_free_poses(500, clearance=0.3, random_state=np.random.RandomState(3))
+    assert poses.shape == (500,3)
+    assert index.is_free(poses[:,:2], 0.3).all()
+    assert (np.abs(poses[:,2]) <= np.pi).all()
+    assert index.sample_free_poses(0).shape == (0,3)
+
+def test_index_dropped_on_obstacle_move(cube_room):
+    index = cube_room.get_spatial_index()
+    assert cube_room.get_spatial_index() is index
+    cube_room.register_positions(cube_room.obstacle_tag, [[-1.0, 1.0, 0.4]])
+    moved = cube_room.get_spatial_index()
+    assert moved is not index
+    assert moved.distance_to_nearest_obstacle([[-1.0, 1.0]])[0] == 0.0
+
+def test_empty_footprints():
+    room = make_cube_room()
+    index = RoomSpatialIndex(room.get_freespace_poly(), [])
+    assert np.isinf(index.distance_to_nearest_obstacle([[0.0, 0.0]])).all()
@@ -0,0 +1,38 @@
+import os
+
+from roomor.dataset import save_rooms
+from roomor.world_export import WorldExporter, export_dataset
+
+from conftest import make_cube_room
+
+def _includes(path):
+    with open(path) as f:
+        return [l.strip() for l in f if '<include>' in l]
+
+def test_export_room(tmp_path, stand_in_models):
+    library = str(tmp_path / 'models')
+    exporter = WorldExporter(library)
+    room = make_cube_room(obstacles=[(1.0, 1.0, 0.0), (-1.0, 1.0, 0.5)])
+    path = exporter.export(room, str(tmp_path / 'room.world'))
+
+    assert os.path.isfile(path)
+    ## wall, obstacle and target models, written complete with no staging directory left behind
+    entries = sorted(os.listdir(library))
+    assert len(entries) == 3 and not any(e.startswith('.') for e in entries)
+    for e in entries:
+        assert sorted(os.listdir(os.path.join(library, e))) == ['model.config', 'model.sdf']
+
+    includes = _includes(path)
+    assert includes[:2] == ['<include><uri>model://sun</uri></include>', '<include><uri>model://ground_plane</uri></include>']
+    assert len(includes) == 2 + 1 + 2 + 1
+    name, _ = exporter.library.get(room.obstacle_config_base[0])
+    assert '<include><uri>model://{}</uri><name>obstacle_1</name><pose>-1 1 0.4 0 0 0.5</pose></include>'.format(name) in includes
+
+def test_export_dataset_shares_library(tmp_path, stand_in_models):
+    rooms = [make_cube_room(), make_cube_room(half_side=3.0)]
+    save_rooms(str(tmp_path / 'rooms.bin'), rooms)
+    paths = export_dataset(str(tmp_path / 'rooms.bin'), str(tmp_path / 'worlds'), str(tmp_path / 'models'), processes=1)
+    assert [os.path.basename(p) for p in paths] == ['room_000000.world', 'room_000001.world']
+    assert all(os.path.isfile(p) for p in paths)
+    ## the obstacle and target models are shared, the walls differ
+    assert len(os.listdir(str(tmp_path / 'models'))) == 4
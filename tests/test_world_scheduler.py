@@ -0,0 +1,35 @@
+import numpy as np
+
+from roomor.world_scheduler import WorldScheduler
+from roomor.fake_proxy import FakeGazeboProxy
+
+from conftest import make_cube_generator
+
+def test_scheduler_spawns_and_repositions(stand_in_models):
+    proxies = [FakeGazeboProxy(latency=0.005) for _ in range(2)]
+    ## processes=0 runs every randoor call on the worlds' threads of this process
+    scheduler = WorldScheduler([make_cube_generator(p) for p in proxies], processes=0)
+    results = list(scheduler.map([1, 2, 3, 4]))
+    assert [r.job_id for r in results] == [1, 2, 3, 4]
+    assert sorted(r.world for r in results) == [0, 0, 1, 1]
+    assert scheduler.metrics()['spawned'] == 4
+
+    ## each world holds its last room: wall, 4 obstacles and a target
+    rooms = [scheduler.worlds[i].room for i in range(2)]
+    assert [len(p.models) for p in proxies] == [6, 6]
+    futures = [scheduler.reposition_target(r) for r in rooms for _ in range(3)]
+    [f.result() for f in futures]
+    for room, proxy in zip(rooms, proxies):
+        assert room.randoor_config.repositioned_locked == [True] * 3
+        name = room.model_manager._model_name('target', 0)
+        np.testing.assert_allclose(proxy.models[name][1], room.spawn_config[room.target_tag]['positions'][0])
+    scheduler.shutdown()
+
+def test_scheduler_rooms_repeat_across_worlds(stand_in_models):
+    proxies = [FakeGazeboProxy() for _ in range(2)]
+    scheduler = WorldScheduler([make_cube_generator(p) for p in proxies], processes=0)
+    ## the same seed on both worlds, generated concurrently, gives the same room
+    a, b = list(scheduler.map([5, 5]))
+    assert a.world != b.world
+    np.testing.assert_array_equal(a.room.pose_buffer, b.room.pose_buffer)
+    scheduler.shutdown()